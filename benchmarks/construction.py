@@ -0,0 +1,48 @@
+"""Benchmark the cost of constructing each element type.
+
+Elements are created under a Group with widget sync turned off, so the
+timings cover HasTraits construction, trait defaults and handler setup but
+not rendering. Run with:
+
+    python benchmarks/construction.py [count]
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+import nbsvg
+from nbsvg.py.svg import global_sync, ELEMENT_TYPES
+
+def construct(klass, parent, count):
+    """Returns the seconds taken to construct count elements of klass"""
+    start = time.time()
+    for i in range(count):
+        klass(parent=parent)
+    return time.time() - start
+
+def notifiers(element):
+    """Returns the number of trait notifiers registered on an instance"""
+    total = 0
+    for value in element._trait_notifiers.values():
+        if isinstance(value, dict):
+            total += sum(len(v) for v in value.values())
+        else:
+            total += len(value)
+    return total
+
+def main(count=1000):
+    if global_sync.get():
+        global_sync.toggle()
+    root = nbsvg.SVG()
+    print('{0:<10} {1:>12} {2:>10}'.format('type', 'us/element', 'notifiers'))
+    for name in sorted(ELEMENT_TYPES):
+        klass = ELEMENT_TYPES[name]
+        parent = nbsvg.Group(parent=root)
+        seconds = construct(klass, parent, count)
+        print('{0:<10} {1:>12.1f} {2:>10}'.format(name, 1e6*seconds/count,
+                                                  notifiers(klass(parent=parent))))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
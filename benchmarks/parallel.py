@@ -0,0 +1,61 @@
+"""Benchmark rendering a large document serially and with SVG.parallel.
+
+The document holds `groups` groups of `count` circles each. Each rendering
+is timed warm (after one untimed render). Besides the serial and parallel
+renderings, the descriptions the pool renders are also rendered in this
+process, so the gain from the processes themselves is shown apart from
+the cheaper rendering of descriptions, and the time the parent spends
+describing the tree is shown on its own, since that part isn't spread
+over the processes. Run with:
+
+    python benchmarks/parallel.py [groups] [count] [processes]
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import multiprocessing
+
+from nbsvg.py.svg import global_sync, from_spec, render_descriptions
+
+def scene(groups, count):
+    """Returns an SVG of groups of count circles each"""
+    return from_spec({'width': 500, 'height': 500, 'children': [
+        {'type': 'g', 'fill': 'red', 'children': [
+            {'type': 'circle', 'cx': i*0.37, 'cy': j, 'r': 2} for i in range(count)]}
+        for j in range(groups)]})
+
+def best(fn, repeat=3):
+    """Returns the least seconds taken by fn over repeat calls, after one more"""
+    fn()
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+    return min(times)
+
+def main(groups=8, count=2500, processes=None):
+    if global_sync.get():
+        global_sync.toggle()
+    processes = processes or multiprocessing.cpu_count()
+    root = scene(groups, count)
+    serial = best(root._repr_svg_)
+    describe = best(lambda: [c._describe() for c in root.children])
+    described = best(lambda: render_descriptions([c._describe() for c in root.children]))
+    root.parallel(processes, min_elements=0)
+    try:
+        parallel = best(root._repr_svg_)
+    finally:
+        root.parallel(0)
+    print('{0} elements, {1} processes'.format(groups*(count + 1), processes))
+    print('{0:<10} {1:>8.3f}s'.format('serial', serial))
+    print('{0:<10} {1:>8.3f}s'.format('parallel', parallel))
+    print('{0:<10} {1:>8.3f}s'.format('described', described))
+    print('{0:<10} {1:>8.3f}s'.format('describe', describe))
+    print('{0:<10} {1:>8.2f}x'.format('speedup', serial/parallel))
+    print('{0:<10} {1:>8.2f}x'.format('pool', described/parallel))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -1,19 +1,154 @@
 define(["jquery", "jupyter-js-widgets"], function($, widget) {
 
+    // inflate a zlib payload, or return null if the browser can't
+    function inflate(buffer) {
+        if (typeof DecompressionStream === 'undefined') {
+            return null;
+        }
+        var stream = new Blob([buffer]).stream()
+            .pipeThrough(new DecompressionStream('deflate'));
+        return new Response(stream).text();
+    }
+
+    // the viewBox of an svg element as [x, y, width, height]
+    function view_box(root) {
+        var box = root.viewBox && root.viewBox.baseVal;
+        if (box && box.width > 0 && box.height > 0) {
+            return [box.x, box.y, box.width, box.height];
+        }
+        var width = parseFloat(root.getAttribute('width')) || root.clientWidth;
+        var height = parseFloat(root.getAttribute('height')) || root.clientHeight;
+        return [0, 0, width, height];
+    }
+
+    // how long navigation pauses before the viewBox is sent to the kernel
+    var NAVIGATE_DELAY = 250;
+
     var SVGView = widget.DOMWidgetView.extend({
 
         render: function(){
             this.$svg = $('<svg>');
             this.$el.append(this.$svg);
+            // counts markup received, so late inflates don't show stale markup
+            this.sequence = 0;
             this.svg_changed();
             this.$el.attr({overflow: 'hidden'});
             this.model.on('change:svg', this.svg_changed, this);
+            this.model.on('msg:custom', this.handle_msg, this);
+            this.navigate();
+            // markup may have been sent deflated before this view existed
+            this.send({event: 'ready'});
+        },
+
+        show: function(markup) {
+            this.$svg.html(markup);
+            // lets the kernel pace animations (see SVG.animate)
+            this.send({event: 'rendered'});
         },
 
         svg_changed: function() {
-            this.$svg.html(this.model.get('svg'))
+            this.sequence += 1;
+            this.show(this.model.get('svg'));
+        },
+
+        handle_msg: function(content, buffers) {
+            if (content.event !== 'svg' || content.encoding !== 'deflate') {
+                return;
+            }
+            var that = this;
+            var sequence = this.sequence += 1;
+            var text = inflate(buffers[0]);
+            if (text === null) {
+                this.send({event: 'inflate-unsupported'});
+                return;
+            }
+            text.then(function(markup) {
+                if (sequence !== that.sequence) {
+                    return;
+                }
+                // without syncing, so markup synced next is always a change
+                that.model.set('svg', markup, {silent: true});
+                that.show(markup);
+            });
+        },
+
+        root: function() {
+            return this.$svg[0].querySelector('svg');
+        },
+
+        // pan by dragging and zoom with the wheel by setting the viewBox
+        // of the markup shown, syncing only the final viewBox
+        navigate: function() {
+            var that = this;
+            var drag = null;
+            this.$el.on('wheel', function(event) {
+                var root = that.root();
+                if (!that.model.get('navigable') || !root) {
+                    return;
+                }
+                event.preventDefault();
+                var e = event.originalEvent;
+                var box = view_box(root);
+                var ctm = root.getScreenCTM();
+                if (!ctm) {
+                    return;
+                }
+                // zoom about the point under the cursor
+                var point = root.createSVGPoint();
+                point.x = e.clientX;
+                point.y = e.clientY;
+                point = point.matrixTransform(ctm.inverse());
+                var factor = Math.exp(e.deltaY * (e.deltaMode ? 0.05 : 0.002));
+                that.set_view_box([point.x - (point.x - box[0]) * factor,
+                                   point.y - (point.y - box[1]) * factor,
+                                   box[2] * factor, box[3] * factor]);
+            });
+            this.$el.on('mousedown', function(event) {
+                var root = that.root();
+                if (!that.model.get('navigable') || !root || event.which !== 1) {
+                    return;
+                }
+                var ctm = root.getScreenCTM();
+                if (!ctm) {
+                    return;
+                }
+                event.preventDefault();
+                drag = {x: event.clientX, y: event.clientY,
+                        box: view_box(root), scale: ctm.a};
+            });
+            $(document).on('mousemove.nbsvg' + this.cid, function(event) {
+                if (drag === null) {
+                    return;
+                }
+                var box = drag.box;
+                that.set_view_box([box[0] - (event.clientX - drag.x) / drag.scale,
+                                   box[1] - (event.clientY - drag.y) / drag.scale,
+                                   box[2], box[3]]);
+            });
+            $(document).on('mouseup.nbsvg' + this.cid, function() {
+                drag = null;
+            });
+        },
+
+        set_view_box: function(box) {
+            var root = this.root();
+            var value = box.map(function(v) {
+                return +v.toFixed(6);
+            }).join(' ');
+            root.setAttribute('viewBox', value);
+            var that = this;
+            clearTimeout(this.navigated);
+            this.navigated = setTimeout(function() {
+                that.send({event: 'viewBox', value: value});
+            }, NAVIGATE_DELAY);
+        },
+
+        remove: function() {
+            clearTimeout(this.navigated);
+            $(document).off('.nbsvg' + this.cid);
+            SVGView.__super__.remove.apply(this, arguments);
         },
     });
 
     return {SVGView: SVGView};
-});
\ No newline at end of file
+});
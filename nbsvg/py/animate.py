@@ -0,0 +1,102 @@
+# encoding: utf-8
+"""Animation on the asyncio Event Loop."""
+
+from __future__ import absolute_import
+
+from functools import partial
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+class Animation(object):
+    """Calls a frame function from the asyncio event loop (see SVG.animate)
+
+    Parameters
+    ----------
+    view : SVG
+        the root element being animated
+    frame_fn : callable
+        called as frame_fn(frame) with the frame number, starting at 0.
+        Returning False ends the animation.
+    fps : float
+        the maximum number of frames per second
+    frames : int or None
+        the number of frames to run (forever if None)
+    ack_timeout : float
+        the longest time (in seconds) to wait for a view to report that it
+        rendered a frame before scheduling the next one anyway.
+    loop : event loop or None
+        defaults to the current event loop (the kernel's)
+
+    Notes
+    -----
+    `future` is resolved with the number of frames run when the animation
+    ends, and cancelling it stops the animation before the next frame.
+    """
+
+    def __init__(self, view, frame_fn, fps=30, frames=None,
+                 ack_timeout=1.0, loop=None):
+        if asyncio is None:
+            raise RuntimeError('animation requires asyncio (Python 3.4+)')
+        if fps <= 0:
+            raise ValueError('fps must be positive')
+        self.view = view
+        self.frame_fn = frame_fn
+        self.interval = 1.0/fps
+        self.frames = frames
+        self.ack_timeout = ack_timeout
+        self.loop = loop or asyncio.get_event_loop()
+        self.future = asyncio.Future(loop=self.loop)
+        self.frame = 0
+        self._handle = self.loop.call_soon(self._step)
+        self.future.add_done_callback(self._stopped)
+
+    def _stopped(self, future):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _step(self):
+        """Run one frame, then wait for it to be rendered and for the next slot"""
+        self._handle = None
+        if self.future.done():
+            return
+        if self.frames is not None and self.frame >= self.frames:
+            self.future.set_result(self.frame)
+            return
+        start = self.loop.time()
+        views = self.view.views
+        widget = views[0] if views else None
+        before = widget.svg if widget is not None else None
+        try:
+            with self.view.hold_sync():
+                result = self.frame_fn(self.frame)
+        except Exception as e:
+            self.future.set_exception(e)
+            return
+        self.frame += 1
+        if result is False:
+            self.future.set_result(self.frame)
+            return
+        if widget is not None and widget.svg != before:
+            ack = widget.rendered(self.loop)
+            timeout = self.loop.call_later(self.ack_timeout, _resolve, ack)
+            ack.add_done_callback(partial(self._rendered, timeout, start))
+        else:
+            self._schedule(start)
+
+    def _rendered(self, timeout, start, future):
+        timeout.cancel()
+        self._schedule(start)
+
+    def _schedule(self, start):
+        if self.future.done():
+            return
+        delay = max(0.0, start + self.interval - self.loop.time())
+        self._handle = self.loop.call_later(delay, self._step)
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,115 @@
+# encoding: utf-8
+"""Command Line Conversion of Scene Specs to SVG Files."""
+
+from __future__ import absolute_import, print_function
+
+import io
+import os
+import sys
+import argparse
+import multiprocessing
+
+from .svg import SVG, from_spec, global_sync
+
+def headless():
+    """Turn widget sync off, so no widgets are made or synced"""
+    if global_sync.get():
+        global_sync.toggle()
+
+def output_path(path, output_dir=None):
+    """Returns where the svg converted from the spec at path is written"""
+    base = os.path.splitext(path)[0] + '.svg'
+    if output_dir is not None:
+        base = os.path.join(output_dir, os.path.basename(base))
+    return base
+
+def convert(path, output_dir=None):
+    """Build the scene spec at path and write it as an svg file
+
+    Returns
+    -------
+    (path, output, error) where error is None or a message.
+    """
+    headless()
+    output = output_path(path, output_dir)
+    try:
+        with io.open(path, encoding='utf-8') as f:
+            root = from_spec(f)
+        if not isinstance(root, SVG):
+            raise ValueError("the root of a spec must be of type 'svg'")
+        root.save(output)
+    except Exception as e:
+        return path, output, '{0}: {1}'.format(type(e).__name__, e)
+    return path, output, None
+
+def _convert(args):
+    return convert(*args)
+
+def iter_inputs(paths, files_from=None):
+    """Yield spec paths from the command line, then one per line of files_from"""
+    for path in paths:
+        yield path
+    if files_from is not None:
+        f = sys.stdin if files_from == '-' else io.open(files_from, encoding='utf-8')
+        try:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+def job_count(value):
+    """Parse --jobs, which is 0 (a job per cpu) or more"""
+    try:
+        jobs = int(value)
+    except ValueError:
+        jobs = -1
+    if jobs < 0:
+        raise argparse.ArgumentTypeError("expected 0 or more jobs, not '{0}'".format(value))
+    return jobs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='nbsvg',
+        description='Convert scene specs (JSON, see from_spec) to svg files.')
+    parser.add_argument('specs', nargs='*', metavar='spec',
+        help='spec files, each written beside itself with an .svg extension')
+    parser.add_argument('-o', '--output-dir',
+        help='write svg files here instead')
+    parser.add_argument('-f', '--files-from', metavar='FILE',
+        help="read more spec paths from FILE, one per line ('-' for stdin)")
+    parser.add_argument('-j', '--jobs', type=job_count, default=1,
+        help='convert this many specs at once (0 for the number of cpus)')
+    args = parser.parse_args(argv)
+    if not args.specs and args.files_from is None:
+        parser.error('no spec files given')
+    if args.output_dir is not None and not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    headless()
+    tasks = ((path, args.output_dir) for path in iter_inputs(args.specs, args.files_from))
+    pool = None
+    if args.jobs != 1:
+        pool = multiprocessing.Pool(args.jobs or None)
+        # results are reported as they finish, so output streams
+        results = pool.imap_unordered(_convert, tasks, chunksize=4)
+    else:
+        results = (_convert(task) for task in tasks)
+    failed = 0
+    try:
+        for path, output, error in results:
+            if error is None:
+                print(output)
+                sys.stdout.flush()
+            else:
+                failed += 1
+                print('nbsvg: {0}: {1}'.format(path, error), file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# encoding: utf-8
+"""Memory Footprint of Element Trees."""
+
+from __future__ import absolute_import
+
+import sys
+import types
+from collections import OrderedDict
+
+try:
+    from traitlets import HasTraits
+except ImportError:
+    from IPython.utils.traitlets import HasTraits
+
+# where the bytes of an element are counted (see memory_report)
+CATEGORIES = ('traits', 'notifiers', 'templates', 'caches', 'registries',
+              'render_cache', 'widget')
+
+# instance attributes holding notifiers and handlers
+NOTIFIER_KEYS = ('_trait_notifiers', '_trait_validators', '_data_handlers')
+
+# instance attributes holding what can be recomputed
+CACHE_KEYS = ('_data_cache', '_fingerprint', '_own_digest', '_spatial_index',
+              '_spatial_dirty', '_query_index', '_watchers', '_joins')
+
+# objects which aren't followed, since they aren't held by an element
+_SHARED = (type, types.ModuleType, types.FunctionType, types.MethodType)
+
+def sizeof(obj, seen=None):
+    """Returns the approximate bytes of obj and the objects it holds
+
+    Parameters
+    ----------
+    obj : object
+    seen : set or None
+        ids of objects already counted, which are skipped (and updated)
+
+    Notes
+    -----
+    Containers, instance dicts and slots are followed. Objects with traits
+    are counted on their own rather than as part of what refers to them,
+    and functions, classes and modules only count their own size.
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, HasTraits):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, _SHARED):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            d = getattr(o, '__dict__', None)
+            if isinstance(d, dict):
+                stack.append(d)
+            for name in getattr(type(o), '__slots__', ()):
+                if hasattr(o, name):
+                    stack.append(getattr(o, name))
+    return total
+
+def _element_bytes(element, seen):
+    """Returns the bytes of an element by category"""
+    counts = dict((c, 0) for c in CATEGORIES)
+    counts['traits'] += sys.getsizeof(element)
+    # markup shown by views may also be held by a render cache
+    for view in getattr(element, 'views', ()) if element.parent is None else ():
+        counts['widget'] += sizeof(view._trait_values.get('svg'), seen)
+        counts['widget'] += sizeof(getattr(view, '_payload', None), seen)
+    d = element.__dict__
+    for key, value in d.items():
+        if key == '_trait_values':
+            values = dict(value)
+            counts['templates'] += sizeof(values.pop('template', None), seen)
+            counts['render_cache'] += sizeof(values.pop('render_cache', None), seen)
+            counts['traits'] += sys.getsizeof(value) + sizeof(values, seen)
+        elif key in NOTIFIER_KEYS:
+            counts['notifiers'] += sizeof(value, seen)
+        elif key in CACHE_KEYS:
+            counts['caches'] += sizeof(value, seen)
+        else:
+            counts['traits'] += sizeof(value, seen)
+    for watcher in d.get('_watchers') or ():
+        if isinstance(watcher, HasTraits) and id(watcher) not in seen:
+            # live collections hold a reference to each of their members
+            seen.add(id(watcher))
+            counts['registries'] += sys.getsizeof(watcher) + sizeof(watcher.__dict__, seen)
+    return counts
+
+def memory_report(root):
+    """Returns the approximate memory held by a tree, by element class and category
+
+    Returns
+    -------
+    An OrderedDict with:
+
+    `classes`
+        an OrderedDict mapping each element class name to an OrderedDict of
+        the `count` of its instances, their bytes in each category and
+        their `total`
+    `categories`
+        the bytes of every element in each category
+    `total`
+        the bytes of every element
+
+    Notes
+    -----
+    The categories are `traits` (each instance, its trait values and other
+    attributes), `notifiers` (trait notifiers and data handlers),
+    `templates` (each element's template), `caches` (data, fingerprint,
+    spatial and query caches), `registries` (live collections watching an
+    element), `render_cache` (markup a RenderCache keeps in memory) and
+    `widget` (the markup held by the root's views). Sizes come from
+    sys.getsizeof and each object is counted once, with the first element
+    holding it, so shared objects aren't counted twice.
+    """
+    seen = set()
+    classes = {}
+    categories = OrderedDict((c, 0) for c in CATEGORIES)
+    stack = [root]
+    while stack:
+        element = stack.pop()
+        counts = _element_bytes(element, seen)
+        name = type(element).__name__
+        row = classes.get(name)
+        if row is None:
+            row = classes[name] = OrderedDict([('count', 0)] + [(c, 0) for c in CATEGORIES])
+            row['total'] = 0
+        row['count'] += 1
+        for c in CATEGORIES:
+            row[c] += counts[c]
+            row['total'] += counts[c]
+            categories[c] += counts[c]
+        stack.extend(getattr(element, 'children', ()))
+    ordered = OrderedDict(sorted(classes.items(), key=lambda i: -i[1]['total']))
+    return OrderedDict([('classes', ordered), ('categories', categories),
+                        ('total', sum(categories.values()))])
+
+def format_memory_report(report):
+    """Returns a memory_report as a table, one row per element class"""
+    columns = ('count',) + CATEGORIES + ('total',)
+    lines = ['{0:<12}'.format('class') + ''.join('{0:>13}'.format(c) for c in columns)]
+    rows = list(report['classes'].items())
+    rows.append(('all', dict(report['categories'], total=report['total'],
+                             count=sum(r['count'] for r in report['classes'].values()))))
+    for name, row in rows:
+        lines.append('{0:<12}'.format(name) + ''.join('{0:>13}'.format(row[c]) for c in columns))
+    return '\n'.join(lines)
@@ -0,0 +1,97 @@
+# encoding: utf-8
+"""Queueing Mutations Made From Other Threads."""
+
+from __future__ import absolute_import
+
+import threading
+from collections import deque
+from functools import wraps
+
+class MutationQueue(object):
+    """Collects calls made from other threads for the owner thread to apply
+
+    Parameters
+    ----------
+    flush : callable
+        called (with no arguments) on the owner thread to apply the queue
+    loop : event loop or None
+        if given, a flush is scheduled on it whenever the queue goes from
+        empty to non-empty. Otherwise flush must be called by hand.
+
+    Notes
+    -----
+    The owner is the thread that creates the queue. `MutationQueue.active`
+    counts the queues in use so that checks can be skipped when it's zero.
+    """
+
+    active = 0
+
+    def __init__(self, flush, loop=None):
+        self.owner = threading.current_thread()
+        self.loop = loop
+        self._flush = flush
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def __len__(self):
+        return len(self._items)
+
+    def is_owner(self):
+        """Returns True if called from the owner thread"""
+        return threading.current_thread() is self.owner
+
+    def put(self, function, *args, **kwargs):
+        """Queue a call to function(*args, **kwargs)"""
+        self._items.append((function, args, kwargs))
+        if self.loop is not None:
+            with self._lock:
+                if self._scheduled:
+                    return
+                self._scheduled = True
+            self.loop.call_soon_threadsafe(self._flush)
+
+    def drain(self):
+        """Returns the calls queued so far, emptying the queue"""
+        with self._lock:
+            self._scheduled = False
+        calls = []
+        for i in range(len(self._items)):
+            calls.append(self._items.popleft())
+        return calls
+
+def mutation_queue(obj):
+    """Returns the MutationQueue of the tree obj belongs to (None if there's none)
+
+    Notes
+    -----
+    For collections of elements (which have no root) this is the queue of
+    the first member whose tree has one.
+    """
+    if hasattr(obj, 'root'):
+        return getattr(obj.root, '_mutation_queue', None)
+    for ref in getattr(obj, 'children', ()):
+        queue = getattr(getattr(ref(), 'root', None), '_mutation_queue', None)
+        if queue is not None:
+            return queue
+    return None
+
+def queued(method):
+    """Queue calls of a mutating element method made from non-owner threads
+
+    Notes
+    -----
+    If the element's root has a MutationQueue (see SVG.queue_mutations)
+    and the caller isn't its owner, the call is queued and None returned.
+    Collections are queued with the tree of their members (see
+    mutation_queue).
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if MutationQueue.active:
+            queue = mutation_queue(self)
+            if queue is not None and not queue.is_owner():
+                queue.put(method, self, *args, **kwargs)
+                return None
+        return method(self, *args, **kwargs)
+    return wrapper
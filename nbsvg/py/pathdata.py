@@ -0,0 +1,243 @@
+# encoding: utf-8
+"""Packed Path Data."""
+
+from __future__ import absolute_import
+
+import re
+from array import array
+
+import numpy as np
+
+from .simplify import simplify_points
+
+# the number of coordinates taken by each path command
+ARITY = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6,
+         'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+
+_PATH_TOKENS = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+def format_numbers(values):
+    """Format a sequence of numbers for output in an svg attribute"""
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return []
+    strings = np.char.rstrip(np.char.rstrip(np.char.mod('%.6f', values), '0'), '.')
+    return ['0' if s in ('', '-', '-0') else s for s in strings.tolist()]
+
+class PathBuffer(object):
+    """Path geometry packed into an opcode array and a coordinate array
+
+    Notes
+    -----
+    Each entry of `ops` is the ascii code of a path command (lower case
+    for relative commands), and consumes `ARITY[command.upper()]` entries
+    from `coords`. Commands given several coordinate groups at once are
+    stored as repeated ops (with the implicit line after a move).
+    """
+
+    def __init__(self):
+        self.ops = array('B')
+        self.coords = array('d')
+        self._last = None
+
+    def __len__(self):
+        return len(self.ops)
+
+    def push(self, command, coords=()):
+        """Append a command to the buffer and return its rendered form"""
+        n = ARITY.get(command.upper())
+        if n is None:
+            raise ValueError("unknown path command '{0}'".format(command))
+        coords = [float(c) for c in coords]
+        if n == 0:
+            if len(coords):
+                raise ValueError("'{0}' takes no coordinates".format(command))
+            groups = [[]]
+        elif len(coords) == 0 or len(coords) % n:
+            raise ValueError("'{0}' takes coordinates in groups of {1}"
+                             " ({2} given)".format(command, n, len(coords)))
+        else:
+            groups = [coords[i:i+n] for i in range(0, len(coords), n)]
+        parts = []
+        for i, group in enumerate(groups):
+            c = command
+            if i > 0 and c in 'Mm':
+                c = 'L' if c == 'M' else 'l'
+            self.ops.append(ord(c))
+            self.coords.extend(group)
+            parts.append(self._render_op(c, format_numbers(group)))
+        return ''.join(parts)
+
+    def extend(self, other):
+        """Append the commands of another PathBuffer"""
+        self.ops.extend(other.ops)
+        self.coords.extend(other.coords)
+        self._last = other._last
+
+    def _render_op(self, command, strings):
+        """Render one op, omitting the letter when it repeats the last one"""
+        if command == self._last and command not in 'MmZz':
+            fragment = ' ' + ' '.join(strings)
+        else:
+            fragment = ' '.join([' ' + command] + strings)
+        self._last = command
+        return fragment
+
+    def commands(self):
+        """Yield (command, coords) pairs for each op in the buffer"""
+        coords = self.coords.tolist()
+        i = 0
+        for op in self.ops.tolist():
+            command = chr(op)
+            n = ARITY[command.upper()]
+            yield command, coords[i:i+n]
+            i += n
+
+    def render(self):
+        """Returns the full path data string"""
+        self._last = None
+        strings = format_numbers(self.coords)
+        parts = []
+        i = 0
+        for command, coords in self.commands():
+            n = len(coords)
+            parts.append(self._render_op(command, strings[i:i+n]))
+            i += n
+        return ''.join(parts).strip()
+
+def parse_path_data(d):
+    """Returns a PathBuffer holding the commands of an svg path data string"""
+    buf = PathBuffer()
+    command = None
+    coords = []
+    for token in _PATH_TOKENS.findall(d):
+        if token.isalpha():
+            if command is not None:
+                buf.push(command, coords)
+            command, coords = token, []
+        elif command is None:
+            raise ValueError("path data must start with a command")
+        else:
+            coords.append(float(token))
+    if command is not None:
+        buf.push(command, coords)
+    return buf
+
+def walk(buffer):
+    """Yield (command, coords, start, end) for each op of a PathBuffer
+
+    Notes
+    -----
+    `command` is upper case, `coords` are absolute, and `start` and `end`
+    are the absolute current points before and after the op. For arcs,
+    only the end point in coords is made absolute.
+    """
+    cx = cy = sx = sy = 0.0
+    for command, coords in buffer.commands():
+        upper = command.upper()
+        if command != upper:
+            if upper == 'H':
+                coords = [coords[0] + cx]
+            elif upper == 'V':
+                coords = [coords[0] + cy]
+            elif upper == 'A':
+                coords = coords[:5] + [coords[5] + cx, coords[6] + cy]
+            else:
+                coords = [c + (cy if i % 2 else cx) for i, c in enumerate(coords)]
+        start = (cx, cy)
+        if upper == 'Z':
+            cx, cy = sx, sy
+        elif upper == 'H':
+            cx = coords[0]
+        elif upper == 'V':
+            cy = coords[0]
+        else:
+            cx, cy = coords[-2:]
+        if upper == 'M':
+            sx, sy = cx, cy
+        yield upper, coords, start, (cx, cy)
+
+def arc_extent(start, coords):
+    """Returns two corners of a box containing an elliptical arc
+
+    Notes
+    -----
+    Radii are scaled up as in the SVG implementation notes when they're
+    too small to reach the end point. Since the center is within the
+    largest radius of the end point, the arc lies within twice that
+    distance of it.
+    """
+    rx, ry, x_rot, arc_flag, sweep_flag, x, y = coords
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0:
+        return []
+    phi = np.radians(x_rot)
+    dx, dy = (start[0]-x)/2, (start[1]-y)/2
+    x1 = np.cos(phi)*dx + np.sin(phi)*dy
+    y1 = -np.sin(phi)*dx + np.cos(phi)*dy
+    scale = max(1.0, np.sqrt(x1**2/rx**2 + y1**2/ry**2))
+    r = 2*scale*max(rx, ry)
+    return [(x-r, y-r), (x+r, y+r)]
+
+def path_points(buffer):
+    """Returns an (n, 2) array of points whose bounding box contains the path
+
+    Notes
+    -----
+    Bezier curves are contained by their control points (including the
+    reflected control points of smooth curves), so those are returned
+    along with the end point of each op.
+    """
+    points = []
+    control = None
+    for command, coords, start, end in walk(buffer):
+        if command == 'A':
+            points.extend(arc_extent(start, coords))
+        elif command in 'CQ':
+            points.extend(zip(coords[:-2:2], coords[1:-2:2]))
+        elif command in 'ST':
+            if control is not None:
+                points.append((2*start[0]-control[0], 2*start[1]-control[1]))
+            points.extend(zip(coords[:-2:2], coords[1:-2:2]))
+        points.append(end)
+        if command in 'CS':
+            control = (coords[-4], coords[-3])
+        elif command == 'Q':
+            control = (coords[0], coords[1])
+        elif command == 'T':
+            if control is None:
+                control = start
+            control = (2*start[0]-control[0], 2*start[1]-control[1])
+        else:
+            control = None
+    return np.array(points, dtype=float).reshape(-1, 2)
+
+def simplify_path(buffer, method, tolerance):
+    """Render a PathBuffer with each run of straight lines simplified
+
+    Notes
+    -----
+    Runs of L, H and V commands are converted to absolute points and
+    simplified with the given method. Simplification keeps the end points
+    of every run, so all other commands (including relative ones) are
+    rendered unchanged.
+    """
+    out = PathBuffer()
+    parts = []
+    run = []
+    for (command, coords), (upper, absolute, start, end) in zip(
+            buffer.commands(), walk(buffer)):
+        if upper in 'LHV':
+            if not run:
+                run = [start]
+            run.append(end)
+            continue
+        if len(run) > 1:
+            points = simplify_points(run, method, tolerance)[1:]
+            parts.append(out.push('L', np.ravel(points)))
+        run = []
+        parts.append(out.push(command, coords))
+    if len(run) > 1:
+        points = simplify_points(run, method, tolerance)[1:]
+        parts.append(out.push('L', np.ravel(points)))
+    return ''.join(parts).strip()
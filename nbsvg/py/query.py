@@ -0,0 +1,394 @@
+# encoding: utf-8
+"""CSS Style Queries of Element Trees."""
+
+from __future__ import absolute_import
+
+import re
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+_IDENT = re.compile(r'-?[_a-zA-Z][-\w]*')
+_VALUE = re.compile(r'[-+\w.%#]+')
+_OPERATORS = ('~=', '^=', '$=', '*=', '=')
+_SPACE = ' \t\r\n'
+
+# parsed queries by their text (see compile_query)
+_plans = {}
+MAX_PLANS = 256
+
+class QueryError(ValueError):
+    pass
+
+class Compound(object):
+    """A compound selector like `circle.marker#a[stroke=blue]`
+
+    Notes
+    -----
+    The tag is matched against the `tag` of an element, ids against its
+    `label`, and classes against the words of its `kind`. Attributes name
+    traits, with dashes standing for underscores, and values are compared
+    as strings, or as numbers when both are lengths in user units.
+    """
+
+    __slots__ = ('tag', 'id', 'classes', 'attrs')
+
+    def __init__(self, tag=None, id=None, classes=(), attrs=()):
+        self.tag = tag
+        self.id = id
+        self.classes = tuple(classes)
+        self.attrs = tuple(attrs)
+
+    def match(self, element):
+        if self.tag is not None and getattr(element, 'tag', None) != self.tag:
+            return False
+        if self.id is not None and getattr(element, 'label', None) != self.id:
+            return False
+        if self.classes:
+            words = (getattr(element, 'kind', None) or u'').split()
+            for c in self.classes:
+                if c not in words:
+                    return False
+        for name, op, value in self.attrs:
+            if not element.has_trait(name):
+                return False
+            actual = getattr(element, name)
+            if actual is None:
+                return False
+            if op is not None and not _compare(unicode(actual), op, value):
+                return False
+        return True
+
+def _number(value):
+    value = value.strip()
+    if value.endswith('px'):
+        value = value[:-2]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def _compare(actual, op, value):
+    if op == '=':
+        if actual == value:
+            return True
+        a, b = _number(actual), _number(value)
+        return a is not None and a == b
+    if op == '~=':
+        return value in actual.split()
+    if op == '^=':
+        return actual.startswith(value)
+    if op == '$=':
+        return actual.endswith(value)
+    return value in actual
+
+class _Parser(object):
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def error(self, message):
+        return QueryError('{0} at {1} in {2!r}'.format(message, self.pos, self.text))
+
+    def space(self):
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] in _SPACE:
+            self.pos += 1
+        return self.pos > start
+
+    def peek(self):
+        return self.text[self.pos] if self.pos < len(self.text) else ''
+
+    def match(self, pattern):
+        m = pattern.match(self.text, self.pos)
+        if m is None:
+            return None
+        self.pos = m.end()
+        return m.group(0)
+
+    def parse(self):
+        """Returns a list of alternatives, each a list of (combinator, Compound)"""
+        alternatives = []
+        while True:
+            self.space()
+            alternatives.append(self.complex())
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            if self.pos < len(self.text):
+                raise self.error('unexpected {0!r}'.format(self.peek()))
+            return alternatives
+
+    def complex(self):
+        steps = [(None, self.compound())]
+        while True:
+            spaced = self.space()
+            char = self.peek()
+            if char == '>':
+                self.pos += 1
+                self.space()
+                steps.append(('>', self.compound()))
+            elif char in ('', ','):
+                return steps
+            elif spaced:
+                steps.append((' ', self.compound()))
+            else:
+                raise self.error('unexpected {0!r}'.format(char))
+
+    def compound(self):
+        tag = None
+        if self.peek() == '*':
+            self.pos += 1
+            tag = '*'
+        else:
+            tag = self.match(_IDENT)
+        ident, classes, attrs = None, [], []
+        while True:
+            char = self.peek()
+            if char == '#':
+                self.pos += 1
+                ident = self.ident()
+            elif char == '.':
+                self.pos += 1
+                classes.append(self.ident())
+            elif char == '[':
+                self.pos += 1
+                attrs.append(self.attribute())
+            else:
+                break
+        if tag is None and ident is None and not classes and not attrs:
+            raise self.error('expected a selector')
+        if tag == '*':
+            tag = None
+        return Compound(tag, ident, classes, attrs)
+
+    def ident(self):
+        name = self.match(_IDENT)
+        if name is None:
+            raise self.error('expected a name')
+        return name
+
+    def attribute(self):
+        self.space()
+        name = self.ident().replace('-', '_')
+        name = {'id': 'label', 'class': 'kind'}.get(name, name)
+        self.space()
+        op = None
+        for o in _OPERATORS:
+            if self.text.startswith(o, self.pos):
+                op = o
+                self.pos += len(o)
+                break
+        value = None
+        if op is not None:
+            self.space()
+            value = self.string()
+            self.space()
+        if self.peek() != ']':
+            raise self.error("expected ']'")
+        self.pos += 1
+        return (name, op, value)
+
+    def string(self):
+        quote = self.peek()
+        if quote in ('"', "'"):
+            end = self.text.find(quote, self.pos+1)
+            if end < 0:
+                raise self.error('unterminated string')
+            value = self.text[self.pos+1:end]
+            self.pos = end + 1
+            return value
+        value = self.match(_VALUE)
+        if value is None:
+            raise self.error('expected a value')
+        return value
+
+def compile_query(text):
+    """Parse a selector like `g[stroke=blue] > circle.marker#a`, with caching
+
+    Notes
+    -----
+    Supported are tag, universal (`*`), id (`#`), class (`.`) and attribute
+    (`[name]`, `[name=value]`, `~=`, `^=`, `$=` and `*=`) selectors, the
+    descendant (space) and child (`>`) combinators, and lists of selectors
+    separated by commas. Parsed queries are kept for reuse.
+    """
+    plan = _plans.get(text)
+    if plan is None:
+        plan = _Parser(text).parse()
+        if len(_plans) >= MAX_PLANS:
+            _plans.clear()
+        _plans[text] = plan
+    return plan
+
+class QueryIndex(object):
+    """The elements of a tree by tag, id and class
+
+    Notes
+    -----
+    The index is kept up to date through the same calls as a LiveCollection
+    (see `update`), so it's registered as a watcher of the root it indexes.
+    """
+
+    def __init__(self, root):
+        self.tags = {}
+        self.ids = {}
+        self.classes = {}
+        self._entries = {}
+        self.insert(root, subtree=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _keys(self, element):
+        kind = getattr(element, 'kind', None) or u''
+        return (getattr(element, 'tag', None), getattr(element, 'label', None),
+                tuple(kind.split()))
+
+    def insert(self, element, subtree=False):
+        """Index element (and its descendants), re-indexing it if it changed"""
+        stack = [element]
+        while stack:
+            e = stack.pop()
+            keys = self._keys(e)
+            entry = self._entries.get(id(e))
+            if entry is None or entry[1] != keys:
+                if entry is not None:
+                    self._remove(e, entry[1])
+                tag, label, classes = keys
+                self.tags.setdefault(tag, set()).add(e)
+                if label:
+                    self.ids.setdefault(label, set()).add(e)
+                for c in classes:
+                    self.classes.setdefault(c, set()).add(e)
+                self._entries[id(e)] = (e, keys)
+            if subtree:
+                stack.extend(getattr(e, 'children', ()))
+
+    def discard(self, element):
+        """Drop element and its descendants from the index"""
+        stack = [element]
+        while stack:
+            e = stack.pop()
+            entry = self._entries.pop(id(e), None)
+            if entry is not None and entry[0] is e:
+                self._remove(e, entry[1])
+            stack.extend(getattr(e, 'children', ()))
+
+    def _remove(self, element, keys):
+        tag, label, classes = keys
+        _drop(self.tags, tag, element)
+        if label:
+            _drop(self.ids, label, element)
+        for c in classes:
+            _drop(self.classes, c, element)
+
+    def _update(self, element, removed=False, structural=False):
+        """Follow a change reported by BaseElement._watch_changed"""
+        if removed:
+            self.discard(element)
+        elif element.parent is None or element in element.parent.children or structural:
+            self.insert(element, subtree=structural)
+
+    def candidates(self, compound):
+        """Returns the smallest indexed set which may match compound (None for all)"""
+        sets = []
+        if compound.id is not None:
+            sets.append(self.ids.get(compound.id, ()))
+        for c in compound.classes:
+            sets.append(self.classes.get(c, ()))
+        if compound.tag is not None:
+            sets.append(self.tags.get(compound.tag, ()))
+        if not sets:
+            return None
+        return min(sets, key=len)
+
+def _drop(table, key, element):
+    members = table.get(key)
+    if members is not None:
+        members.discard(element)
+        if not members:
+            del table[key]
+
+def _matches(element, steps, i):
+    """Returns True if element matches steps[:i+1], checking ancestors as needed"""
+    combinator, compound = steps[i]
+    if not compound.match(element):
+        return False
+    if i == 0:
+        return True
+    parent = element.parent
+    if combinator == '>':
+        return parent is not None and _matches(parent, steps, i-1)
+    while parent is not None:
+        if _matches(parent, steps, i-1):
+            return True
+        parent = parent.parent
+    return False
+
+def run_query(plan, scope, index):
+    """Returns the descendants of scope matching a compiled query
+
+    Parameters
+    ----------
+    plan : list
+        from compile_query
+    scope : Element
+        only descendants of scope are returned, though ancestors of scope
+        may match the leading selectors (as with querySelectorAll)
+    index : QueryIndex or None
+        used to find candidates by id, class or tag. Without an index, or
+        for selectors with none of those, every descendant is a candidate.
+
+    Returns
+    -------
+    The matching elements in document order.
+    """
+    found = {}
+    descendants = None
+    for steps in plan:
+        last = steps[-1][1]
+        candidates = index.candidates(last) if index is not None else None
+        if candidates is None:
+            if descendants is None:
+                descendants = _descendants(scope)
+            candidates = descendants
+        elif candidates:
+            candidates = [e for e in candidates if _within(e, scope)]
+        for e in candidates:
+            if id(e) not in found and _matches(e, steps, len(steps)-1):
+                found[id(e)] = e
+    return sorted(found.values(), key=lambda e: _position(e, scope))
+
+def _descendants(scope):
+    elements = []
+    stack = list(reversed(getattr(scope, 'children', ())))
+    while stack:
+        e = stack.pop()
+        elements.append(e)
+        stack.extend(reversed(getattr(e, 'children', ())))
+    return elements
+
+def _within(element, scope):
+    """Returns True if element is an attached descendant of scope"""
+    child, parent = element, element.parent
+    while parent is not None:
+        if child not in parent.children:
+            return False
+        if parent is scope:
+            return True
+        child, parent = parent, parent.parent
+    return False
+
+def _position(element, scope):
+    """Returns a key which sorts elements in document order"""
+    path = []
+    while element is not scope:
+        parent = element.parent
+        path.append(parent.children.position(element))
+        element = parent
+    path.reverse()
+    return path
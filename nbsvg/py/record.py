@@ -0,0 +1,339 @@
+# encoding: utf-8
+"""Recording and Replay of Document Changes."""
+
+from __future__ import absolute_import
+
+import io
+import re
+import json
+import time
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+
+from .animate import asyncio
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+FORMAT = 'nbsvg-recording'
+VERSION = 1
+
+class Recorder(object):
+    """Writes the frames of an SVG to a file as keyframes and attribute deltas
+
+    Parameters
+    ----------
+    view : SVG
+        the root being recorded
+    path : str
+        the file written, one JSON object per line
+
+    Notes
+    -----
+    The first line is a header and each following line is a frame: either
+    a keyframe {"t": ms, "svg": markup} holding the whole document, or
+    {"t": ms, "c": [[path, attrs, full], ...]} listing the elements whose
+    attributes changed. An element's path is the index of each child on
+    the way down from the root, and its attrs map attribute names to their
+    new values (null for removed ones, and "#text" for text content). When
+    `full` is 1, attrs are all of the element's attributes.
+
+    The view reports each sync to `frame`, and the changes since the last
+    one are those reported by its elements (see BaseElement._watch_changed),
+    so only changed elements are looked at. Children being added, removed
+    or reordered lead to a keyframe, as does every frame of a view which
+    culls or aggregates its children, since then children aren't rendered
+    at stable positions.
+    """
+
+    def __init__(self, view, path):
+        self.view = view
+        self.path = path
+        self._file = io.open(path, 'w', encoding='utf-8')
+        self._start = time.time()
+        self._dirty = OrderedDict()
+        self._last = {}
+        self._keyframe = True
+        self.frames = 0
+        self._write({'format': FORMAT, 'version': VERSION})
+        self.frame()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._file is None
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(',', ':'), ensure_ascii=False)
+        self._file.write(unicode(line) + u'\n')
+
+    def _update(self, element, removed=False, structural=False):
+        """Follow a change reported by BaseElement._watch_changed"""
+        if removed or structural:
+            self._keyframe = True
+        else:
+            self._dirty[id(element)] = element
+
+    def frame(self, svg=None):
+        """Write the changes since the last frame
+
+        Parameters
+        ----------
+        svg : str or None
+            the markup of the whole view if it's already been rendered
+        """
+        if self._file is None:
+            return
+        view = self.view
+        t = int(round((time.time() - self._start)*1000))
+        if self._keyframe or view.culling or view.lod_threshold > 0:
+            if svg is None:
+                svg = view._repr_svg_()
+            self._write({'t': t, 'svg': svg})
+            self._keyframe = False
+            self._dirty.clear()
+            self._last.clear()
+            self.frames += 1
+            return
+        changes = []
+        for element in self._dirty.values():
+            path = element_path(element, view)
+            if path is None:
+                continue
+            attrs = element._render_attributes()
+            last = self._last.get(id(element))
+            self._last[id(element)] = (element, attrs)
+            if last is None or last[0] is not element:
+                changes.append([path, attrs, 1])
+                continue
+            delta = dict((k, v) for k, v in attrs.items() if last[1].get(k) != v)
+            for k in last[1]:
+                if k not in attrs:
+                    delta[k] = None
+            if delta:
+                changes.append([path, delta, 0])
+        self._dirty.clear()
+        if changes:
+            self._write({'t': t, 'c': changes})
+            self.frames += 1
+
+    def close(self):
+        """Stop recording and close the file"""
+        if self._file is None:
+            return
+        self.view._stop_recording(self)
+        self._file.close()
+        self._file = None
+
+def element_path(element, root):
+    """Returns the child indices leading from root to element (None if detached)"""
+    path = []
+    while element is not root:
+        parent = element.parent
+        if parent is None or element not in parent.children:
+            return None
+        path.append(parent.children.position(element))
+        element = parent
+    path.reverse()
+    return path
+
+def read_recording(path):
+    """Yield the frames of a recording as dicts (see Recorder)"""
+    with io.open(path, encoding='utf-8') as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get('format') != FORMAT:
+            raise ValueError('{0} is not an nbsvg recording'.format(path))
+        if header.get('version') != VERSION:
+            raise ValueError('unsupported recording version {0}'.format(header.get('version')))
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+_TAG = re.compile(r'<(/?)([-\w:]+)((?:[^>"]|"[^"]*")*?)(/?)>')
+_ATTR = re.compile(r'([-\w:]+)="([^"]*)"')
+
+class _Node(object):
+
+    __slots__ = ('tag', 'attrs', 'content', 'void')
+
+    def __init__(self, tag, attrs, void):
+        self.tag = tag
+        self.attrs = attrs
+        self.content = []
+        self.void = void
+
+    def children(self):
+        return [c for c in self.content if isinstance(c, _Node)]
+
+    def render(self):
+        attrs = ''.join(u' {0}="{1}"'.format(k, v) for k, v in self.attrs.items())
+        if self.void:
+            return u'<{0}{1}/>'.format(self.tag, attrs)
+        content = u''.join(c.render() if isinstance(c, _Node) else c for c in self.content)
+        return u'<{0}{1}>{2}</{0}>'.format(self.tag, attrs, content)
+
+def _parse_markup(markup):
+    """Returns the root _Node of rendered markup"""
+    root = _Node(None, OrderedDict(), False)
+    stack = [root]
+    pos = 0
+    for m in _TAG.finditer(markup):
+        if m.start() > pos:
+            stack[-1].content.append(markup[pos:m.start()])
+        pos = m.end()
+        closing, tag, attrs, void = m.groups()
+        if closing:
+            if len(stack) > 1:
+                stack.pop()
+            continue
+        node = _Node(tag, OrderedDict(_ATTR.findall(attrs)), bool(void))
+        stack[-1].content.append(node)
+        if not void:
+            stack.append(node)
+    if pos < len(markup):
+        stack[-1].content.append(markup[pos:])
+    children = root.children()
+    return children[0] if children else root
+
+def _apply(node, changes):
+    for path, attrs, full in changes:
+        target = node
+        try:
+            for i in path:
+                target = target.children()[i]
+        except IndexError:
+            continue
+        if full:
+            target.attrs = OrderedDict()
+        for k, v in attrs.items():
+            if k == '#text':
+                target.content = [] if v is None else [escape(v)]
+            elif v is None:
+                target.attrs.pop(k, None)
+            else:
+                target.attrs[k] = v
+
+def replay_frames(path):
+    """Yield (seconds, markup) for each frame of a recording"""
+    node = None
+    for frame in read_recording(path):
+        if 'svg' in frame:
+            node = _parse_markup(frame['svg'])
+            yield frame['t']/1000.0, frame['svg']
+        elif node is not None:
+            _apply(node, frame['c'])
+            yield frame['t']/1000.0, node.render()
+
+def replay(path, widget, speed=1.0, loop=None):
+    """Show the frames of a recording on a widget at their original timing
+
+    Parameters
+    ----------
+    path : str
+        the recording
+    widget : SVGWidget
+        the widget whose `svg` is set to each frame
+    speed : float
+        how many times faster than recorded to play
+
+    Returns
+    -------
+    A future resolved with the number of frames shown (cancel it to stop).
+    """
+    if asyncio is None:
+        raise RuntimeError('replay requires asyncio (Python 3.4+)')
+    loop = loop or asyncio.get_event_loop()
+    future = asyncio.Future(loop=loop)
+    frames = replay_frames(path)
+    start = loop.time()
+    state = {'count': 0}
+
+    def step():
+        if future.done():
+            return
+        try:
+            t, svg = next(frames)
+        except StopIteration:
+            future.set_result(state['count'])
+            return
+        except Exception as e:
+            future.set_exception(e)
+            return
+        delay = start + t/speed - loop.time()
+        loop.call_later(max(0.0, delay), show, svg)
+
+    def show(svg):
+        if future.done():
+            return
+        widget.svg = svg
+        state['count'] += 1
+        step()
+
+    loop.call_soon(step)
+    return future
+
+_PLAYER = u'''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<div id="nbsvg-replay"></div>
+<script>
+(function() {{
+  var frames = {frames};
+  var speed = {speed};
+  var view = document.getElementById('nbsvg-replay');
+  function show(frame) {{
+    if (frame.svg !== undefined) {{
+      view.innerHTML = frame.svg;
+      return;
+    }}
+    var root = view.firstElementChild;
+    frame.c.forEach(function(change) {{
+      var target = root;
+      for (var i = 0; i < change[0].length && target; i++) {{
+        target = target.children[change[0][i]];
+      }}
+      if (!target) {{ return; }}
+      if (change[2]) {{
+        while (target.attributes.length) {{
+          target.removeAttribute(target.attributes[0].name);
+        }}
+      }}
+      Object.keys(change[1]).forEach(function(name) {{
+        var value = change[1][name];
+        if (name === '#text') {{ target.textContent = value === null ? '' : value; }}
+        else if (value === null) {{ target.removeAttribute(name); }}
+        else {{ target.setAttribute(name, value); }}
+      }});
+    }});
+  }}
+  var start = null;
+  function play(i) {{
+    if (i >= frames.length) {{ return; }}
+    var now = Date.now();
+    if (start === null) {{ start = now - frames[i].t/speed; }}
+    setTimeout(function() {{ show(frames[i]); play(i + 1); }},
+               Math.max(0, start + frames[i].t/speed - now));
+  }}
+  play(0);
+}})();
+</script>
+</body>
+</html>
+'''
+
+def export_html(path, html_path, speed=1.0):
+    """Write a standalone html page which plays a recording back"""
+    frames = json.dumps(list(read_recording(path)), separators=(',', ':'))
+    # keep markup in the frames from ending the script early
+    frames = frames.replace('</', '<\\/')
+    page = _PLAYER.format(title='nbsvg replay', frames=frames, speed=json.dumps(float(speed)))
+    with io.open(html_path, 'w', encoding='utf-8') as f:
+        f.write(unicode(page))
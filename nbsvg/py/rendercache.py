@@ -0,0 +1,150 @@
+# encoding: utf-8
+"""On-Disk Cache of Rendered Subtrees."""
+
+from __future__ import absolute_import
+
+import io
+import os
+import time
+import tempfile
+from collections import OrderedDict
+
+class RenderCache(object):
+    """A size-bounded LRU cache of rendered markup keyed by fingerprint
+
+    Parameters
+    ----------
+    directory : str
+        where entries are stored, one file per key. It's created if needed
+        and can be shared by several processes.
+    max_bytes : int
+        the total size of the entries in directory. Whenever it's
+        exceeded, the least recently used entries are deleted (see
+        low_water).
+    memory_items : int
+        the number of recently used entries also kept in memory
+    low_water : float
+        the fraction of max_bytes entries are evicted down to, so that
+        eviction (which lists the directory) doesn't run on every put
+    touch_interval : float
+        the seconds between marking an entry as used on disk
+
+    Notes
+    -----
+    Recency is tracked through the modification time of each file, so
+    eviction respects use from any process. A hit updates it only when
+    this process last did so more than touch_interval ago, since the order
+    of entries used within that time hardly matters to eviction, and
+    otherwise each cached subtree would cost a syscall on every render.
+    Entries are written to a temporary file and renamed into place, so a
+    reader never sees a partial entry.
+    """
+
+    suffix = '.svg'
+
+    def __init__(self, directory, max_bytes=64*2**20, memory_items=256, low_water=0.75,
+                 touch_interval=60.0):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.low_water = low_water
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._size = sum(size for path, size, mtime in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _entries(self):
+        """Returns (path, size, mtime) for each entry on disk"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _remember(self, key, text, touched):
+        self._memory.pop(key, None)
+        self._memory[key] = (text, touched)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._memory or os.path.exists(self._path(key))
+
+    def get(self, key, default=None):
+        """Returns the markup stored under key, marking it as recently used"""
+        path = self._path(key)
+        text, touched = self._memory.get(key, (None, None))
+        now = time.time()
+        try:
+            if text is None:
+                with io.open(path, encoding='utf-8') as f:
+                    text = f.read()
+            if touched is None or now - touched >= self.touch_interval:
+                os.utime(path, None)
+                touched = now
+        except (IOError, OSError):
+            self._memory.pop(key, None)
+            self.misses += 1
+            return default
+        self._remember(key, text, touched)
+        self.hits += 1
+        return text
+
+    def put(self, key, text):
+        """Store markup under key, evicting old entries if over max_bytes"""
+        path = self._path(key)
+        data = text.encode('utf-8')
+        try:
+            # an entry being rewritten no longer counts
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(temp, path)
+        except (IOError, OSError):
+            if os.path.exists(temp):
+                os.remove(temp)
+            return
+        self._remember(key, text, time.time())
+        self._size += len(data) - previous
+        if self._size > self.max_bytes:
+            self.evict(int(self.max_bytes*self.low_water))
+
+    def evict(self, max_bytes=None):
+        """Delete the least recently used entries until under max_bytes"""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        size = sum(e[1] for e in entries)
+        for path, nbytes, mtime in entries:
+            if size <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= nbytes
+            key = os.path.basename(path)[:-len(self.suffix)]
+            self._memory.pop(key, None)
+        self._size = size
+
+    def clear(self):
+        """Delete every entry"""
+        self.evict(0)
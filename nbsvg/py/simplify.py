@@ -0,0 +1,97 @@
+# encoding: utf-8
+"""Vectorized Polyline Simplification."""
+
+from __future__ import absolute_import
+
+import numpy as np
+
+def douglas_peucker(points, tolerance):
+    """Returns the subset of points kept by Douglas-Peucker simplification
+
+    Parameters
+    ----------
+    points : array_like
+        an (n, 2) array of vertices
+    tolerance : float
+        vertices closer than this to the simplified line are dropped
+
+    Notes
+    -----
+    The recursion is unrolled onto a stack of index ranges, and the
+    distances for each range are computed in one vectorized pass.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n-1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        inner = points[start+1:end]
+        ab = b - a
+        length = np.hypot(ab[0], ab[1])
+        if length == 0:
+            dist = np.hypot(inner[:,0]-a[0], inner[:,1]-a[1])
+        else:
+            dist = np.abs(ab[0]*(inner[:,1]-a[1]) - ab[1]*(inner[:,0]-a[0]))/length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            i += start + 1
+            keep[i] = True
+            stack.append((start, i))
+            stack.append((i, end))
+    return points[keep]
+
+def minmax_decimate(points, width):
+    """Returns the vertices which bound each vertical strip of the given width
+
+    Parameters
+    ----------
+    points : array_like
+        an (n, 2) array of vertices, usually ordered along x (e.g. a trace)
+    width : float
+        the strip width, typically the number of user units per pixel
+
+    Notes
+    -----
+    Consecutive vertices falling in the same strip are reduced to the first,
+    last, lowest and highest of them (in their original order), so no more
+    than four vertices are drawn per pixel column while the visible envelope
+    of the trace is preserved.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    n = len(points)
+    if n < 5 or width <= 0:
+        return points
+    columns = np.floor((points[:,0] - points[0,0])/width)
+    breaks = np.flatnonzero(np.diff(columns)) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [n])) - 1
+    runs = np.repeat(np.arange(len(starts)), ends - starts + 1)
+    order = np.lexsort((points[:,1], runs))
+    keep = np.concatenate((starts, ends, order[starts], order[ends]))
+    return points[np.unique(keep)]
+
+def simplify_points(points, method, tolerance):
+    """Simplify points using the named method
+
+    Parameters
+    ----------
+    points : array_like
+        an (n, 2) array of vertices
+    method : str
+        either 'douglas_peucker' or 'minmax'
+    tolerance : float
+        the tolerance (or strip width) in the units of points
+    """
+    if method == 'douglas_peucker':
+        return douglas_peucker(points, tolerance)
+    elif method == 'minmax':
+        return minmax_decimate(points, tolerance)
+    else:
+        raise ValueError("unknown simplification method '{0}'".format(method))
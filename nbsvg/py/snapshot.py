@@ -0,0 +1,267 @@
+# encoding: utf-8
+"""Compact Binary Snapshots of Element Trees."""
+
+from __future__ import absolute_import
+
+import re
+import ast
+import json
+import struct
+from copy import deepcopy
+
+import numpy as np
+
+from .pathdata import format_numbers
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+MAGIC = b'NBSVG'
+VERSION = 1
+# magic, format version, header length
+_PREFIX = struct.Struct('<5sBI')
+_UNITS = re.compile(r'^(-?(?:\d+\.?\d*|\.\d+))([a-z%]*)$')
+
+class SnapshotError(ValueError):
+    pass
+
+class Node(object):
+    """One element of a snapshot
+
+    Parameters
+    ----------
+    cls : str
+        the element class as 'module.name'
+    parent : int
+        the index of the parent node (-1 for the root). Nodes are listed in
+        document order, so parents always come before their children.
+    key : int or str
+        the key the element is stored under in its parent's ChildStore
+    values : dict
+        trait names (and a few private attributes) mapped to their values
+    ops, coords : array_like or None
+        path geometry as in a PathBuffer
+    """
+
+    __slots__ = ('cls', 'parent', 'key', 'values', 'ops', 'coords')
+
+    def __init__(self, cls, parent, key, values, ops=None, coords=None):
+        self.cls = cls
+        self.parent = parent
+        self.key = key
+        self.values = values
+        self.ops = ops
+        self.coords = coords
+
+class _Writer(object):
+
+    def __init__(self):
+        self.strings = []
+        self._interned = {}
+        self.arrays = []
+        self.size = 0
+
+    def intern(self, string):
+        i = self._interned.get(string)
+        if i is None:
+            i = self._interned[string] = len(self.strings)
+            self.strings.append(string)
+        return i
+
+    def array(self, values, dtype):
+        data = np.asarray(values, dtype=dtype).tobytes()
+        self.arrays.append(data)
+        self.size += len(data)
+        return [self.size - len(data), np.dtype(dtype).str, len(values)]
+
+    def indices(self, strings):
+        """Pack interned strings as the smallest unsigned integers which fit"""
+        indices = [self.intern(s) for s in strings]
+        size = max(indices) if indices else 0
+        dtype = '<u1' if size < 2**8 else '<u2' if size < 2**16 else '<u4'
+        return self.array(indices, dtype)
+
+    def column(self, values):
+        """Pack a column of values, returning its description"""
+        types = set(type(v) for v in values)
+        if len(types) == 1 and values.count(values[0]) == len(values):
+            return ['c', self.intern(repr(_plain(values[0]))), len(values)]
+        if types == set([bool]):
+            return ['b', self.array(values, '<u1')]
+        if types and types <= set([int, type(2**64)]):
+            if all(-2**63 <= v < 2**63 for v in values):
+                return ['i', self.array(values, '<i8')]
+        if types == set([float]):
+            return ['f', self.array(values, '<f8')]
+        if types == set([unicode]):
+            unit = self._unit_column(values)
+            if unit is not None:
+                return unit
+            return ['s', self.indices(values)]
+        return ['r', self.indices([repr(_plain(v)) for v in values])]
+
+    def _unit_column(self, values):
+        """Pack strings like '12px' as numbers with a shared unit if possible"""
+        numbers = []
+        unit = None
+        for v in values:
+            match = _UNITS.match(v)
+            if match is None or (unit is not None and match.group(2) != unit):
+                return None
+            unit = match.group(2)
+            numbers.append(float(match.group(1)))
+        if [s + unit for s in format_numbers(numbers)] != list(values):
+            return None
+        return ['u', self.array(numbers, '<f8'), unit]
+
+def _plain(value):
+    """Convert numpy scalars within value to python numbers for repr"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return type(value)(_plain(v) for v in value)
+    return value
+
+class _Reader(object):
+
+    def __init__(self, strings, blob):
+        self.strings = strings
+        self.blob = blob
+
+    def array(self, spec):
+        offset, dtype, count = spec
+        dtype = np.dtype(dtype)
+        if count == 0:
+            return np.zeros(0, dtype)
+        return np.frombuffer(self.blob, dtype, count, offset)
+
+    def column(self, spec):
+        """Unpack a column of values described by spec"""
+        kind = spec[0]
+        if kind == 'c':
+            value = ast.literal_eval(self.strings[spec[1]])
+            if isinstance(value, (list, dict, set)):
+                return [deepcopy(value) for i in range(spec[2])]
+            return [value]*spec[2]
+        data = self.array(spec[1])
+        if kind == 'b':
+            return [bool(v) for v in data.tolist()]
+        if kind in 'if':
+            return data.tolist()
+        if kind == 'u':
+            unit = spec[2]
+            return [unicode(s + unit) for s in format_numbers(data)]
+        strings = self.strings
+        if kind == 's':
+            return [strings[i] for i in data.tolist()]
+        if kind == 'r':
+            literals = {}
+            values = []
+            for i in data.tolist():
+                if i not in literals:
+                    literals[i] = ast.literal_eval(strings[i])
+                value = literals[i]
+                if isinstance(value, (list, dict, set)):
+                    value = deepcopy(value)
+                values.append(value)
+            return values
+        raise SnapshotError("unknown column kind '{0}'".format(kind))
+
+def dump(nodes):
+    """Encode a list of Nodes in document order as bytes
+
+    Notes
+    -----
+    The output is MAGIC, the format version and the length of a JSON
+    header, then the header and a blob of little endian arrays. Values are
+    stored in columns, one per trait of each element class: numbers as
+    arrays, lengths sharing a unit as numbers plus that unit, and other
+    values as indices into a table of interned strings (reprs for values
+    which aren't strings). Columns holding a single value store it once.
+    """
+    w = _Writer()
+    classes = []
+    class_index = {}
+    codes, parents, keys = [], [], []
+    groups = {}
+    for node in nodes:
+        c = class_index.get(node.cls)
+        if c is None:
+            c = class_index[node.cls] = len(classes)
+            classes.append(node.cls)
+            groups[c] = []
+        codes.append(c)
+        parents.append(node.parent)
+        keys.append(node.key)
+        groups[c].append(node)
+    header = {'nodes': len(nodes), 'classes': classes,
+              'class': w.array(codes, '<u2'),
+              'parent': w.array(parents, '<i4'),
+              'key': w.column(keys), 'columns': [], 'paths': []}
+    for c in range(len(classes)):
+        members = groups[c]
+        names = sorted(members[0].values)
+        for node in members:
+            if len(node.values) != len(names):
+                raise SnapshotError('nodes of the same class must have the same values')
+        header['columns'].append(dict((name, w.column([n.values[name] for n in members]))
+                                      for name in names))
+        if members[0].ops is None:
+            header['paths'].append(None)
+            continue
+        ops = [np.asarray(n.ops, dtype='<u1') for n in members]
+        coords = [np.asarray(n.coords, dtype='<f8') for n in members]
+        header['paths'].append({
+            'nops': w.array([len(o) for o in ops], '<u4'),
+            'ncoords': w.array([len(x) for x in coords], '<u4'),
+            'ops': w.array(np.concatenate(ops) if ops else [], '<u1'),
+            'coords': w.array(np.concatenate(coords) if coords else [], '<f8')})
+    header['strings'] = w.strings
+    encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return b''.join([_PREFIX.pack(MAGIC, VERSION, len(encoded)), encoded] + w.arrays)
+
+def load(buf):
+    """Decode bytes from dump back into a list of Nodes"""
+    buf = bytes(buf)
+    if len(buf) < _PREFIX.size:
+        raise SnapshotError('not an nbsvg snapshot')
+    magic, version, length = _PREFIX.unpack_from(buf)
+    if magic != MAGIC:
+        raise SnapshotError('not an nbsvg snapshot')
+    if version != VERSION:
+        raise SnapshotError('unsupported snapshot version {0}'.format(version))
+    start = _PREFIX.size
+    header = json.loads(buf[start:start+length].decode('utf-8'))
+    r = _Reader(header['strings'], buf[start+length:])
+    codes = r.array(header['class']).tolist()
+    parents = r.array(header['parent']).tolist()
+    keys = r.column(header['key'])
+    counts = np.bincount(codes, minlength=len(header['classes'])).tolist()
+    columns, paths = [], []
+    for count, spec, path in zip(counts, header['columns'], header['paths']):
+        names = sorted(spec)
+        if names:
+            values = [r.column(spec[name]) for name in names]
+            rows = [dict(zip(names, row)) for row in zip(*values)]
+        else:
+            rows = [{} for i in range(count)]
+        columns.append(iter(rows))
+        if path is None:
+            paths.append(None)
+            continue
+        ops, coords = r.array(path['ops']), r.array(path['coords'])
+        op_ends = np.cumsum(r.array(path['nops'])).tolist()
+        coord_ends = np.cumsum(r.array(path['ncoords'])).tolist()
+        paths.append(iter([(ops[a:b], coords[c:d]) for a, b, c, d in
+                           zip([0] + op_ends[:-1], op_ends, [0] + coord_ends[:-1], coord_ends)]))
+    nodes = []
+    classes = header['classes']
+    for i in range(header['nodes']):
+        c = codes[i]
+        node = Node(classes[c], parents[i], keys[i], next(columns[c]))
+        if paths[c] is not None:
+            node.ops, node.coords = next(paths[c])
+        nodes.append(node)
+    return nodes
@@ -0,0 +1,134 @@
+# encoding: utf-8
+"""Spatial Indexing of Element Bounding Boxes."""
+
+from __future__ import absolute_import
+
+from math import floor, sqrt
+
+class GridIndex(object):
+    """A uniform grid of cells mapping regions to the items which overlap them
+
+    Parameters
+    ----------
+    cell_size : float
+        the width and height of each grid cell in user units
+    max_cells : int
+        items whose box covers more than this many cells are kept in a
+        separate list which is checked on every query, rather than being
+        copied into each cell.
+
+    Notes
+    -----
+    Items are arbitrary hashable objects stored with an (x0, y0, x1, y1)
+    box. Queries return items in the order they were first inserted.
+    """
+
+    def __init__(self, cell_size, max_cells=64):
+        self.cell_size = float(cell_size)
+        self.max_cells = max_cells
+        self._cells = {}
+        self._large = set()
+        self._boxes = {}
+        self._order = {}
+        self._counter = 0
+
+    @classmethod
+    def from_boxes(cls, items, boxes, per_cell=2):
+        """Build an index whose cell size suits the given boxes
+
+        Notes
+        -----
+        The cell size is chosen so that, if the boxes were evenly spread
+        over their combined extent, each cell would hold about `per_cell`
+        of them, and so that the median box spans about one cell. A few
+        much larger boxes then end up with the large items (see
+        max_cells) rather than making every cell bigger.
+        """
+        boxes = list(boxes)
+        if len(boxes) == 0:
+            index = cls(1.0)
+        else:
+            w = max(b[2] for b in boxes) - min(b[0] for b in boxes)
+            h = max(b[3] for b in boxes) - min(b[1] for b in boxes)
+            size = sqrt(max(w*h, 1e-12)*per_cell/len(boxes))
+            extents = sorted(max(b[2]-b[0], b[3]-b[1]) for b in boxes)
+            median = extents[len(extents)//2]
+            index = cls(max(size, median, 1e-6))
+        for item, box in zip(items, boxes):
+            index.insert(item, box)
+        return index
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, item):
+        return item in self._boxes
+
+    def _span(self, box):
+        size = self.cell_size
+        return (int(floor(box[0]/size)), int(floor(box[1]/size)),
+                int(floor(box[2]/size)), int(floor(box[3]/size)))
+
+    def insert(self, item, box):
+        """Add item with the given box, replacing any previous entry"""
+        if item in self._boxes:
+            self.discard(item, keep_order=True)
+        else:
+            self._order[item] = self._counter
+            self._counter += 1
+        self._boxes[item] = box
+        i0, j0, i1, j1 = self._span(box)
+        if (i1-i0+1)*(j1-j0+1) > self.max_cells:
+            self._large.add(item)
+            return
+        for i in range(i0, i1+1):
+            for j in range(j0, j1+1):
+                self._cells.setdefault((i, j), set()).add(item)
+
+    def discard(self, item, keep_order=False):
+        """Remove item from the index if it is present"""
+        box = self._boxes.pop(item, None)
+        if box is None:
+            return
+        if not keep_order:
+            del self._order[item]
+        if item in self._large:
+            self._large.discard(item)
+            return
+        i0, j0, i1, j1 = self._span(box)
+        for i in range(i0, i1+1):
+            for j in range(j0, j1+1):
+                cell = self._cells.get((i, j))
+                if cell is not None:
+                    cell.discard(item)
+                    if not cell:
+                        del self._cells[(i, j)]
+
+    def box(self, item):
+        """Returns the box item was inserted with"""
+        return self._boxes[item]
+
+    def query(self, x0, y0, x1, y1):
+        """Returns the items whose box overlaps the region (x0, y0, x1, y1)"""
+        i0, j0, i1, j1 = self._span((x0, y0, x1, y1))
+        found = set()
+        if (i1-i0+1)*(j1-j0+1) > len(self._cells):
+            cells = [c for (i, j), c in self._cells.items()
+                     if i0 <= i <= i1 and j0 <= j <= j1]
+        else:
+            cells = [self._cells.get((i, j)) for i in range(i0, i1+1)
+                     for j in range(j0, j1+1)]
+        for cell in cells:
+            if cell:
+                found.update(cell)
+        found.update(self._large)
+        boxes = self._boxes
+        result = [item for item in found if not (boxes[item][2] < x0
+                  or boxes[item][0] > x1 or boxes[item][3] < y0
+                  or boxes[item][1] > y1)]
+        result.sort(key=self._order.__getitem__)
+        return result
+
+    def point(self, x, y):
+        """Returns the items whose box contains the point (x, y)"""
+        return self.query(x, y, x, y)
@@ -0,0 +1,294 @@
+# encoding: utf-8
+"""Incremental Reading of Declarative Element Specs."""
+
+from __future__ import absolute_import
+
+import re
+import json
+import codecs
+import numpy as np
+
+# characters which may continue a number
+NUMBER_CHARS = u'0123456789+-.eE'
+
+_STRUCTURE = re.compile(r'[\[\]{}"]')
+_STRING = re.compile(r'["\\]')
+# runs without strings at least this long are scanned with numpy
+VECTOR_SCAN = 256
+
+def _depths(text, depth):
+    """Returns the nesting depth after each character of text (without strings)"""
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    steps = ((codes == 91) | (codes == 123)).astype(np.intp)
+    steps -= (codes == 93) | (codes == 125)
+    return depth + np.cumsum(steps)
+
+class SpecError(ValueError):
+    pass
+
+def _scan(text, i, state):
+    """Scan text from i for the end of a string, array or object
+
+    Parameters
+    ----------
+    text : unicode
+    i : int
+        where to start
+    state : tuple
+        (depth, in_string, escaped) from the scan of the text before
+
+    Returns
+    -------
+    (end, state) where end is the index just past the value, or None if
+    it continues past text.
+    """
+    depth, in_string, escaped = state
+    if escaped:
+        # the character after a backslash ending the previous text
+        i += 1
+    while True:
+        if in_string:
+            m = _STRING.search(text, i)
+            if m is None:
+                return None, (depth, True, False)
+            if m.group() == u'\\':
+                if m.end() >= len(text):
+                    return None, (depth, True, True)
+                i = m.end() + 1
+                continue
+            in_string = False
+            i = m.end()
+            if depth == 0:
+                return i, (0, False, False)
+        else:
+            quote = text.find(u'"', i)
+            stop = len(text) if quote < 0 else quote
+            if stop - i >= VECTOR_SCAN:
+                depths = _depths(text[i:stop], depth)
+                closed = np.flatnonzero(depths <= 0)
+                if len(closed):
+                    return i + int(closed[0]) + 1, (0, False, False)
+                depth = int(depths[-1])
+                if quote < 0:
+                    return None, (depth, False, False)
+                i = quote
+            m = _STRUCTURE.search(text, i)
+            if m is None:
+                return None, (depth, False, False)
+            i = m.end()
+            char = m.group()
+            if char == u'"':
+                in_string = True
+            elif char in u'[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth <= 0:
+                    return i, (0, False, False)
+
+class SpecReader(object):
+    """Reads a JSON element spec from a file-like object a chunk at a time
+
+    Parameters
+    ----------
+    stream : file-like
+        yields text, or utf-8 encoded bytes, from stream.read(size)
+    chunk_size : int
+        the number of characters (or bytes) read at once
+
+    Notes
+    -----
+    An element spec is a JSON object of attributes, whose `children` key
+    (if any) holds a list of element specs. Only the attributes of the
+    element being read are held in memory: each child is handed over to
+    the caller as soon as its own attributes have been read (see read).
+    """
+
+    def __init__(self, stream, chunk_size=2**16):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buf = u''
+        self._pos = 0
+        self._eof = False
+
+    def read(self, open, close):
+        """Read one element spec, passing it to open and close
+
+        Parameters
+        ----------
+        open : callable
+            called as open(attrs, parent) once an element's attributes
+            before its children are known, returning a handle which is
+            passed as the parent of its children. The root's parent is None.
+        close : callable
+            called as close(handle, attrs) when the element ends, with any
+            attributes which followed its children.
+
+        Returns
+        -------
+        The handle of the root element.
+        """
+        handle = self._element(None, open, close)
+        if self._peek() != u'':
+            raise self._error('unexpected data after the spec')
+        return handle
+
+    def _read(self):
+        """Returns the next chunk of text ('' at the end)"""
+        if self._eof:
+            return u''
+        chunk = self.stream.read(self.chunk_size)
+        while isinstance(chunk, bytes):
+            data = chunk
+            chunk = self._utf8.decode(data, not data)
+            if chunk or not data:
+                break
+            # only part of a character was read
+            chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+        return chunk
+
+    def _more(self):
+        """Read another chunk into the buffer, returning False at the end"""
+        chunk = self._read()
+        if not chunk:
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _extent(self):
+        """Read until the string, array or object at self._pos is in the buffer
+
+        Notes
+        -----
+        Each chunk is scanned once, carrying the scan state over to the
+        next, and the chunks are joined once the end is found, so values
+        spanning many chunks take linear time.
+        """
+        pieces = [self._buf[self._pos:]]
+        end, state = _scan(pieces[0], 0, (0, False, False))
+        while end is None:
+            chunk = self._read()
+            if not chunk:
+                self._buf, self._pos = u''.join(pieces), 0
+                raise self._error('unterminated value')
+            end, state = _scan(chunk, 0, state)
+            if end is not None:
+                end += sum(len(p) for p in pieces)
+            pieces.append(chunk)
+        self._buf, self._pos = u''.join(pieces), 0
+        return end
+
+    def _peek(self):
+        """Skip whitespace and return the next character ('' at the end)"""
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in u' \t\r\n':
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._more():
+                return u''
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise self._error("expected '{0}'".format(char))
+        self._pos += 1
+
+    def _error(self, message):
+        near = self._buf[self._pos:self._pos+20]
+        return SpecError('{0} near {1!r}'.format(message, near))
+
+    def _value(self):
+        """Decode the next JSON value, reading more until it's complete"""
+        if self._peek() in (u'"', u'[', u'{'):
+            end = self._extent()
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                raise self._error('invalid JSON value')
+            self._pos = end
+            return value
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                if not self._more():
+                    raise self._error('invalid JSON value')
+                continue
+            # a number is only complete once something else follows it
+            # (e.g. '1.' may continue as '1.5' in the next chunk)
+            if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                and (end == len(self._buf) or self._buf[end] in NUMBER_CHARS)
+                and self._more()):
+                continue
+            self._pos = end
+            return value
+
+    def _element(self, parent, open, close):
+        self._expect(u'{')
+        attrs = {}
+        handle = None
+        if self._peek() == u'}':
+            self._pos += 1
+        else:
+            while True:
+                key = self._value()
+                self._expect(u':')
+                if key == 'children':
+                    if handle is None:
+                        handle, attrs = open(attrs, parent), {}
+                    self._children(handle, open, close)
+                else:
+                    attrs[key] = self._value()
+                char = self._peek()
+                self._pos += 1
+                if char == u'}':
+                    break
+                elif char != u',':
+                    self._pos -= 1
+                    raise self._error("expected ',' or '}'")
+        if handle is None:
+            handle, attrs = open(attrs, parent), {}
+        close(handle, attrs)
+        return handle
+
+    def _children(self, parent, open, close):
+        self._expect(u'[')
+        if self._peek() == u']':
+            self._pos += 1
+            return
+        while True:
+            self._element(parent, open, close)
+            char = self._peek()
+            self._pos += 1
+            if char == u']':
+                return
+            elif char != u',':
+                self._pos -= 1
+                raise self._error("expected ',' or ']'")
+
+def walk_spec(spec, open, close):
+    """Pass an element spec given as a dict to open and close (see SpecReader.read)"""
+    attrs = dict(spec)
+    children = attrs.pop('children', [])
+    stack = [(None, attrs, children)]
+    root = None
+    while stack:
+        parent, attrs, children = stack.pop()
+        if attrs is None:
+            close(parent, {})
+            continue
+        handle = open(attrs, parent)
+        if root is None:
+            root = handle
+        stack.append((handle, None, None))
+        for child in reversed(children):
+            child = dict(child)
+            stack.append((handle, child, child.pop('children', [])))
+    return root
@@ -3,26 +3,53 @@
 
 from __future__ import absolute_import
 
+import io
+import zlib
 import types
+import hashlib
 import inspect
 import weakref
+import multiprocessing
 import inspect
 import numpy as np
 from threading import Lock
-from string import Template
+from string import Template, Formatter
 from copy import copy
+from collections import OrderedDict
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
 
 from ipywidgets import widgets
 from IPython.display import display
 
+from .spatial import GridIndex
+from .simplify import simplify_points
+from .pathdata import (PathBuffer, path_points, simplify_path, format_numbers,
+    parse_path_data)
+from .animate import Animation, asyncio
+from .mutations import MutationQueue, queued
+from .rendercache import RenderCache
+from . import snapshot as snapshots
+from .spec import SpecReader, SpecError, walk_spec
+from .query import QueryIndex, QueryError, compile_query, run_query
+from .record import Recorder
+from .memory import memory_report, format_memory_report
+
 try:
-    from traitlets import (Any, Bool, Float, Tuple, Unicode,
+    from traitlets import (Any, Bool, Int, Float, Tuple, Unicode,
         CUnicode, HasTraits, Instance, List, Dict, TraitType,
-        Type, TraitError, Container, Union)
+        Type, TraitError, Container, Union, Enum)
 except ImportError:
-    from IPython.utils.traitlets import (Any, Bool, Float,
+    from IPython.utils.traitlets import (Any, Bool, Int, Float,
         Tuple, Unicode, CUnicode, HasTraits, Instance, List,
-        Dict, TraitType, Type, TraitError, Container, Union)
+        Dict, TraitType, Type, TraitError, Container, Union, Enum)
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
 
 # Global Widget Sync Control
 
@@ -137,6 +164,431 @@ def copy_display(from_element, to_element, *exclude):
             ):
                 setattr(to_element,name,new_trait)
 
+def length_to_float(value):
+    """Convert a length into a number of user units
+
+    Notes
+    -----
+    Returns None for relative lengths (`%`, `em`, `ex`) or anything
+    else which can't be resolved without a browser."""
+    if value is None:
+        return None
+    if isinstance(value,(int,float)):
+        return float(value)
+    value = value.strip()
+    if value.endswith('px'):
+        value = value[:-2]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def format_number(value):
+    """Format a number for output in an svg attribute"""
+    string = '%.6f' % value
+    string = string.rstrip('0').rstrip('.')
+    if string in ('','-','-0'):
+        return '0'
+    return string
+
+def bbox_union(boxes):
+    """Return the (x0, y0, x1, y1) box which contains all the given boxes
+
+    Notes
+    -----
+    If any box is None (unknown extent) then the union is also None."""
+    boxes = list(boxes)
+    if len(boxes) == 0 or None in boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+def iter_leaves(element):
+    """Yield the descendants of element which have no children, in document order"""
+    stack = [element]
+    while stack:
+        e = stack.pop()
+        if isinstance(e, Element):
+            stack.extend(reversed(e.children))
+        else:
+            yield e
+
+def transform_matrix(name, args):
+    """Returns the 3x3 matrix of an svg transform function
+
+    Parameters
+    ----------
+    name : str
+        one of 'translate', 'rotate', 'scale', 'skewX', 'skewY' or 'matrix'
+    args : tuple
+        the arguments passed to that transform function
+    """
+    args = [float(a) for a in args]
+    m = np.identity(3)
+    if name == 'translate':
+        m[0,2] = args[0]
+        m[1,2] = args[1] if len(args) > 1 else 0
+    elif name == 'scale':
+        m[0,0] = args[0]
+        m[1,1] = args[1] if len(args) > 1 else args[0]
+    elif name == 'rotate':
+        a = np.radians(args[0])
+        c, s = np.cos(a), np.sin(a)
+        m[:2,:2] = [[c, -s], [s, c]]
+        if len(args) == 3:
+            cx, cy = args[1:]
+            m[0,2] = cx - c*cx + s*cy
+            m[1,2] = cy - s*cx - c*cy
+    elif name == 'skewX':
+        m[0,1] = np.tan(np.radians(args[0]))
+    elif name == 'skewY':
+        m[1,0] = np.tan(np.radians(args[0]))
+    elif name == 'matrix':
+        a, b, c, d, e, f = args
+        m[:2] = [[a, c, e], [b, d, f]]
+    else:
+        raise ValueError("unknown transform function '{0}'".format(name))
+    return m
+
+def compose_transforms(functions):
+    """Returns the 3x3 matrix of a list of transforms
+
+    Parameters
+    ----------
+    functions : list
+        each item is either a 3x3 matrix or a tuple whose first item names
+        a transform function (see `transform_matrix`) and whose remaining
+        items are its arguments, e.g. ('rotate', 30, 10, 10). They are
+        composed left to right, as in an svg transform list.
+    """
+    matrix = np.identity(3)
+    for f in functions:
+        if isinstance(f, tuple) and len(f) and isinstance(f[0], (str, unicode)):
+            m = transform_matrix(f[0], f[1:])
+        else:
+            m = np.asarray(f, dtype=float).reshape(3, 3)
+        matrix = matrix.dot(m)
+    return matrix
+
+def render_matrices(matrices):
+    """Render a stack of 3x3 matrices as quoted svg `matrix(...)` transforms"""
+    matrices = np.asarray(matrices, dtype=float).reshape(-1, 3, 3)
+    coefficients = matrices[:, [0, 1, 0, 1, 0, 1], [0, 0, 1, 1, 2, 2]]
+    strings = format_numbers(coefficients.ravel())
+    return ['"matrix({0})"'.format(' '.join(strings[i:i+6]))
+            for i in range(0, len(strings), 6)]
+
+def transform_bbox(matrix, box):
+    """Returns the axis aligned bounds of a box after applying a 3x3 matrix"""
+    x0, y0, x1, y1 = box
+    corners = np.array([[x0, x1, x0, x1], [y0, y0, y1, y1], [1, 1, 1, 1]])
+    x, y = matrix.dot(corners)[:2]
+    return (x.min(), y.min(), x.max(), y.max())
+
+@contextmanager
+def _null_context():
+    yield
+
+def data_columns(data):
+    """Returns a dict of column names to lists and the number of rows in data
+
+    Parameters
+    ----------
+    data : DataFrame, dict, structured array, or list of dicts
+        a pandas DataFrame (or anything with `columns` that can be indexed
+        by column name), a dict of column names to sequences, a NumPy
+        structured array, or a list of row dictionaries.
+    """
+    if hasattr(data, 'columns') and hasattr(data, '__getitem__'):
+        columns = dict((c, list(np.asarray(data[c]).tolist())) for c in data.columns)
+    elif isinstance(data, dict):
+        columns = dict((c, list(np.asarray(v).tolist())) for c, v in data.items())
+    elif getattr(getattr(data, 'dtype', None), 'names', None):
+        columns = dict((c, data[c].tolist()) for c in data.dtype.names)
+    else:
+        rows = list(data)
+        names = set()
+        for row in rows:
+            names.update(row.keys())
+        columns = dict((c, [row.get(c) for row in rows]) for c in names)
+        return columns, len(rows)
+    lengths = set(len(v) for v in columns.values())
+    if len(lengths) > 1:
+        raise ValueError('all columns must have the same length')
+    return columns, lengths.pop() if lengths else 0
+
+def digest(*parts):
+    """Returns the sha1 hex digest of a sequence of strings"""
+    h = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = part.encode('utf-8')
+        h.update(part)
+        h.update(b'\0')
+    return h.hexdigest()
+
+def handles(*names, **metadata):
+    """Decorate a method to be called when the given traits change
+
+    Notes
+    -----
+    Traits are given by name and by metadata as in HasTraits.trait_names.
+    Handlers are gathered once per class (see trait_handlers) and called by
+    BaseElement._notify_trait, so no notifiers are registered on each
+    instance. Like on_trait_change handlers, they may take no arguments
+    or (name, old, new).
+    """
+    def decorator(method):
+        method._handles = (names, metadata)
+        return method
+    return decorator
+
+def trait_handlers(cls):
+    """Returns {trait name: [(method name, takes args), ...]} for a class
+
+    Notes
+    -----
+    Handlers of base classes come first. Methods are looked up by name when
+    called, so overriding a handler doesn't require decorating it again.
+    """
+    table = cls.__dict__.get('_handler_table')
+    if table is None:
+        table = {}
+        seen = set()
+        for klass in reversed(cls.__mro__):
+            for attr in sorted(klass.__dict__):
+                spec = getattr(klass.__dict__[attr], '_handles', None)
+                if spec is None or attr in seen:
+                    continue
+                seen.add(attr)
+                args = getargspec(getattr(cls, attr)).args
+                entry = (attr, len(args) > 1)
+                names, metadata = spec
+                if metadata:
+                    names = names + tuple(cls.class_trait_names(**metadata))
+                for name in names:
+                    table.setdefault(name, []).append(entry)
+        cls._handler_table = table
+    return table
+
+def snapshot_names(cls):
+    """Returns the names of the traits of an element class stored by SVG.snapshot"""
+    names = cls.__dict__.get('_snapshot_names')
+    if names is None:
+        names = [n for n in cls.class_trait_names() if n not in SNAPSHOT_SKIP]
+        cls._snapshot_names = names
+    return names
+
+def attr_traits(cls):
+    """Returns the traits of an element class rendered as attributes"""
+    traits = cls.__dict__.get('_attr_traits')
+    if traits is None:
+        anyattr = lambda v: False if v is None else True
+        traits = cls._attr_traits = cls.class_traits(attr=anyattr)
+    return traits
+
+def data_names(cls):
+    """Returns the names of the Data traits of a class"""
+    names = cls.__dict__.get('_data_names')
+    if names is None:
+        traits = cls.class_traits()
+        names = [n for n in traits if isinstance(traits[n], Data)]
+        cls._data_names = names
+    return names
+
+def data_cache(obj):
+    """Returns the dict of Data trait values behind obj.data
+
+    Notes
+    -----
+    The dict is kept on obj and only the entries cleared since the last
+    call (see clear_data_cache) are read again, so it must not be modified.
+    """
+    cache = obj.__dict__.get('_data_cache')
+    if cache is None:
+        cache = obj.__dict__['_data_cache'] = {}
+    names = data_names(type(obj))
+    if len(cache) != len(names):
+        for name in names:
+            if name not in cache:
+                cache[name] = getattr(obj, name)
+    return cache
+
+def clear_data_cache(obj, *names):
+    """Drop the given names (or all names) from the cache of obj.data
+
+    Notes
+    -----
+    Data.__set__ does this itself. Code writing straight to
+    obj._trait_values must call it for the Data traits it writes.
+    """
+    cache = obj.__dict__.get('_data_cache')
+    if cache is None:
+        return
+    if names:
+        for name in names:
+            cache.pop(name, None)
+    else:
+        cache.clear()
+
+def lengths_to_floats(values):
+    """Convert a sequence of lengths to a float array (see `length_to_float`)
+
+    Notes
+    -----
+    Relative lengths and anything else which can't be resolved become NaN.
+    Plain numbers and `px` lengths are converted in one vectorized step.
+    """
+    try:
+        strings = np.char.strip(np.asarray(values, dtype='U'))
+        strings = np.where(np.char.endswith(strings, u'px'),
+                           np.char.replace(strings, u'px', u''), strings)
+        return strings.astype(float)
+    except (TypeError, ValueError):
+        floats = [length_to_float(v) for v in values]
+        return np.array([np.nan if v is None else v for v in floats], dtype=float)
+
+# characters escaped in text and attribute values (see escape_markup)
+MARKUP_ENTITIES = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'), ('"', '&quot;'))
+
+def escape_markup(values):
+    """XML-escape a sequence of strings, returning an array of them
+
+    Notes
+    -----
+    Each entity is replaced in one vectorized step over all the strings.
+    Values which aren't strings are converted first.
+    """
+    values = np.asarray(values, dtype='U')
+    for char, entity in MARKUP_ENTITIES:
+        values = np.char.replace(values, char, entity)
+    return values
+
+def column_text(values, n, numbers=True):
+    """Returns the first n of a column as escaped strings (see Labels)
+
+    Notes
+    -----
+    Columns of numbers (lengths) are formatted like other coordinates
+    unless `numbers` is False, when every value is escaped as text. A
+    column of one value is repeated n times.
+    """
+    text = None
+    if numbers:
+        try:
+            text = np.asarray(format_numbers(values), dtype='U')
+        except (TypeError, ValueError):
+            pass
+    if text is None:
+        text = escape_markup(values)
+    if len(text) == 1:
+        return np.repeat(text, n)
+    return text[:n]
+
+def label_count(strings, x, y):
+    """Returns the number of labels given by columns of strings, x and y"""
+    lengths = [len(c) for c in (strings, x, y) if len(c) != 1]
+    return min(lengths) if lengths else len(strings)
+
+def render_labels(strings, x, y):
+    """Render columns of strings, x and y as text elements (see Labels)"""
+    n = label_count(strings, x, y)
+    if n == 0:
+        return u''
+    parts = np.char.add(u'<text x="', column_text(x, n))
+    parts = np.char.add(parts, u'" y="')
+    parts = np.char.add(parts, column_text(y, n))
+    parts = np.char.add(parts, u'">')
+    parts = np.char.add(parts, column_text(strings, n, numbers=False))
+    parts = np.char.add(parts, u'</text>')
+    return u'\n'.join(parts.tolist())
+
+def snapshot_name(klass):
+    """Returns the name a snapshot stores an element class under"""
+    return '{0}.{1}'.format(klass.__module__, klass.__name__)
+
+def register_element(klass):
+    """Let snapshots of elements of klass be restored (see SVG.restore)
+
+    Element classes in SPEC_TYPES are registered already. Returns klass, so
+    this can be used as a class decorator.
+    """
+    if not (isinstance(klass, type) and issubclass(klass, BaseElement)):
+        raise TypeError("'{0}' is not an element class".format(klass))
+    SNAPSHOT_TYPES[snapshot_name(klass)] = klass
+    return klass
+
+def import_element(name):
+    """Returns the registered element class with the given 'module.name'
+
+    Only classes in SNAPSHOT_TYPES are returned, so restoring a snapshot
+    never imports modules named by its bytes.
+    """
+    klass = SNAPSHOT_TYPES.get(name)
+    if klass is None:
+        raise snapshots.SnapshotError("'{0}' is not a registered element class "
+                                      "(see register_element)".format(name))
+    return klass
+
+def subtree_size(element):
+    """Returns the number of elements in the subtree of element"""
+    count = 0
+    stack = [element]
+    while stack:
+        e = stack.pop()
+        count += 1
+        if isinstance(e, Element):
+            stack.extend(e.children)
+    return count
+
+def template_fields(template):
+    """Returns the names of the placeholders in a template string"""
+    fields = _template_fields.get(template)
+    if fields is None:
+        if len(_template_fields) > 4096:
+            _template_fields.clear()
+        fields = [f[1] for f in _formatter.parse(template) if f[1]]
+        _template_fields[template] = fields
+    return fields
+
+_formatter = Formatter()
+_template_fields = {}
+
+def value_fields(template):
+    """Returns the placeholders of a template other than {children}"""
+    fields = _value_fields.get(template)
+    if fields is None:
+        if len(_value_fields) > 4096:
+            _value_fields.clear()
+        fields = tuple(n for n in template_fields(template) if n != 'children')
+        _value_fields[template] = fields
+    return fields
+
+_value_fields = {}
+
+def render_description(description):
+    """Render the output of BaseElement._describe as _render_template would"""
+    klass, template, raw, children = description
+    values = klass._format_values(value_fields(template), raw)
+    if children is not None:
+        values = dict(values, children=u'\n'.join(
+            render_description(c) for c in children))
+    return template.format(**values)
+
+def render_descriptions(descriptions):
+    """Render a list of descriptions, joined by newlines (see SVG.parallel)"""
+    return u'\n'.join(render_description(d) for d in descriptions)
+
+def _in_view(element, viewport):
+    """Returns False if element lies outside viewport (see SVG.culling)"""
+    box = element.bbox()
+    return box is None or bbox_intersects(box, viewport)
+
+def bbox_intersects(box, other):
+    """Returns True if two (x0, y0, x1, y1) boxes overlap"""
+    return not (box[2] < other[0] or box[0] > other[2]
+                or box[3] < other[1] or box[1] > other[3])
+
 
 #-----------------------------------------------------------------------------
 # Basic classes
@@ -155,6 +607,8 @@ class Length(CUnicode):
         """Converts all length inputs to px, ex, em, and %"""
         if isinstance(value,int):
             return unicode(value)+u"px"
+        if isinstance(value,float):
+            return unicode(format_number(value))+u"px"
         if isinstance(value,str):
             return unicode(value)
         if isinstance(value,unicode):
@@ -164,6 +618,42 @@ class Length(CUnicode):
         else:
             raise TraitError('invalid value for type: %r' % value)
 
+class ViewBox(CUnicode):
+
+    def validate(self, obj, value):
+        """Converts (x, y, width, height) sequences and strings to a viewBox"""
+        if value is None and self.allow_none is True:
+            return value
+        if isinstance(value,(str,unicode)):
+            value = value.replace(',',' ').split()
+        if isinstance(value,(tuple,list)) and len(value)==4:
+            try:
+                return u' '.join(format_number(float(v)) for v in value)
+            except (TypeError, ValueError):
+                pass
+        raise TraitError('invalid value for viewBox: %r' % (value,))
+
+class Column(TraitType):
+    """A sequence of values stored as a tuple
+
+    Notes
+    -----
+    Lists, tuples and arrays are accepted, and a single string or number
+    is a column of one.
+    """
+
+    default_value = ()
+    info_text = 'a sequence of values'
+
+    def validate(self, obj, value):
+        if isinstance(value, np.ndarray):
+            return tuple(value.ravel().tolist())
+        if isinstance(value, (list, tuple)):
+            return tuple(value)
+        if isinstance(value, (str, unicode, int, float)):
+            return (value,)
+        self.error(obj, value)
+
 class DataDict(Dict):
 
     def instance_init(self, obj):
@@ -174,12 +664,7 @@ class DataDict(Dict):
         if obj is None:
             return self
         else:
-            data = {}
-            traits = obj.traits()
-            for name in traits.keys():
-                if isinstance(traits[name],Data):
-                    data[name] = getattr(obj,name)
-            return data
+            return dict(data_cache(obj))
 
     def __set__(self, obj, value):
         new = self._validate(obj,value)
@@ -194,6 +679,9 @@ class Data(TraitType):
         self.trait = trait
         self.info_text = trait.info_text
         self.default_value = trait.default_value
+        if hasattr(trait, 'make_dynamic_default'):
+            # containers (e.g. List) build a fresh default per instance
+            self.make_dynamic_default = trait.make_dynamic_default
         super(Data,self).__init__(**metadata)
 
     def set_handler(self, handler):
@@ -204,41 +692,42 @@ class Data(TraitType):
 
     def instance_init(self, obj):
         trait = self.trait
-        trait.name = self.name
-        trait.this_class = self.this_class
-        if hasattr(trait, '_resolve_classes'):
-            trait._resolve_classes()
-
-        default = lambda name, old, new: new
-        default.__name__ = self.name + '_data_handler'
-        obj.on_trait_change(default,self.name)
-
-        data = getattr(obj.__class__, 'data')
-        data.instance_init(obj)
-
+        if trait.name != self.name:
+            # the inner trait only needs to be set up once
+            trait.name = self.name
+            trait.this_class = self.this_class
+            if hasattr(trait, '_resolve_classes'):
+                trait._resolve_classes()
         super(Data,self).instance_init(obj)
 
     def __set__(self, obj, value):
         if callable(value):
-            self._replace_handler(self, obj, value)
+            self._replace_handler(obj, value)
             value = self.__get__(obj)
+        # dropped before notifying, so handlers reading obj.data see value
+        clear_data_cache(obj, self.name)
         super(Data,self).__set__(obj,value)
         # must be careful not to call __set__ in data
         # or else recursion will occur (see DataDict)
 
     def _replace_handler(self, obj, handler):
-        handler_name = self.name+'_data_handler'
-        handler.__name__ = handler_name
-        try:
-            nlist = obj._trait_notifiers[self.name]
-        except KeyError:
-            obj._trait_notifiers[self.name] = [handler]
-            return
-        for i in range(len(nlist)):
-            c = nlist[i]
-            if c.__name__ is handler_name:
-                nlist[i] = handler
-                return
+        """Make handler the data handler of this trait on obj
+
+        Notes
+        -----
+        Elements call their data handlers from _notify_trait, so nothing is
+        registered until a handler is given. Other objects fall back to
+        on_trait_change.
+        """
+        handlers = obj.__dict__.get('_data_handlers')
+        if handlers is None:
+            handlers = obj.__dict__['_data_handlers'] = {}
+        previous = handlers.get(self.name)
+        handlers[self.name] = handler
+        if not isinstance(obj, BaseElement):
+            if previous is not None:
+                obj.on_trait_change(previous, self.name, remove=True)
+            obj.on_trait_change(handler, self.name)
 
     def validate(self, obj, value):
         return self.trait.validate(obj,value)
@@ -260,14 +749,216 @@ class ReferenceIterator(object):
         return self
         
     def next(self):
+        refs = self.refs
+        while self.i < len(refs):
+            r = refs[self.i]
+            self.i += 1
+            if r() is not None:
+                return r
+        raise StopIteration
+
+    __next__ = next
+
+def _reference_callback(registry):
+    """Returns a weakref callback reporting dead references to registry"""
+    owner = weakref.ref(registry)
+    def callback(ref):
+        r = owner()
+        if r is not None:
+            r._reference_died(ref)
+    return callback
+
+class ChildStore(object):
+    """An ordered mapping of keys to child elements which behaves like a list
+
+    Notes
+    -----
+    Each child is stored under a stable key given when it is added, which
+    defaults to the child's label, or to a generated integer when the label
+    is empty or already taken. Keys taken from labels follow changes to the
+    label (see relabel). Removal, replacement and lookup by key or by child
+    are O(1); positional indexing uses a list which is rebuilt after each
+    change.
+    """
+
+    def __init__(self, children=()):
+        self._items = OrderedDict()
+        self._keys = {}
+        self._list = None
+        self._positions = None
+        self._counter = 0
+        self.extend(children)
+
+    def _changed(self):
+        self._list = None
+        self._positions = None
+
+    def _as_list(self):
+        if self._list is None:
+            self._list = list(self._items.values())
+        return self._list
+
+    def _generate_key(self):
+        while self._counter in self._items:
+            self._counter += 1
+        key = self._counter
+        self._counter += 1
+        return key
+
+    def _new_key(self, child, key):
+        if id(child) in self._keys:
+            raise ValueError('{0} is already a child'.format(child))
+        if key is None:
+            key = getattr(child, 'label', None) or None
+            if key in self._items:
+                # labels aren't required to be unique
+                key = None
+        if key is None:
+            key = self._generate_key()
+        elif key in self._items:
+            raise KeyError('a child with the key {0!r} already exists'.format(key))
+        return key
+
+    def __iter__(self):
+        return iter(self._as_list())
+
+    def __reversed__(self):
+        return reversed(self._as_list())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        return self._as_list()[index]
+
+    def __contains__(self, child):
+        return id(child) in self._keys
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, self._as_list())
+
+    def key_of(self, child):
+        """Returns the key child is stored under"""
+        try:
+            return self._keys[id(child)]
+        except KeyError:
+            raise ValueError('{0} is not a child'.format(child))
+
+    def keys(self):
+        return list(self._items.keys())
+
+    def items(self):
+        return list(self._items.items())
+
+    def get(self, key, default=None):
+        """Returns the child stored under key"""
+        return self._items.get(key, default)
+
+    def index(self, child):
+        return self._as_list().index(child)
+
+    def position(self, child):
+        """Returns the index of child, from a table rebuilt after each change"""
+        if self._positions is None:
+            self._positions = dict((id(c), i) for i, c in enumerate(self._as_list()))
         try:
-            r = self.refs[self.i]
-        except IndexError:
-            raise StopIteration
-        if r() is None:
-            return self.next()
-        self.i += 1
-        return r
+            return self._positions[id(child)]
+        except KeyError:
+            raise ValueError('{0} is not a child'.format(child))
+
+    def append(self, child, key=None):
+        """Add child to the end, stored under key"""
+        key = self._new_key(child, key)
+        self._items[key] = child
+        self._keys[id(child)] = key
+        self._changed()
+        return key
+
+    def extend(self, children):
+        for c in children:
+            self.append(c)
+
+    def insert(self, index, child, key=None):
+        """Add child at the given position (O(n))"""
+        key = self._new_key(child, key)
+        items = list(self._items.items())
+        items.insert(index, (key, child))
+        self._items = OrderedDict(items)
+        self._keys[id(child)] = key
+        self._changed()
+        return key
+
+    def remove(self, child):
+        """Remove child"""
+        key = self.key_of(child)
+        del self._items[key]
+        del self._keys[id(child)]
+        self._changed()
+
+    def pop(self, index=-1):
+        child = self._as_list()[index]
+        self.remove(child)
+        return child
+
+    def replace(self, old, new):
+        """Put new in place of old (a child or a key), keeping its key"""
+        key = old if old in self._items else self.key_of(old)
+        if id(new) in self._keys:
+            raise ValueError('{0} is already a child'.format(new))
+        del self._keys[id(self._items[key])]
+        self._items[key] = new
+        self._keys[id(new)] = key
+        self._changed()
+        return key
+
+    def reorder(self, keys):
+        """Order the children by keys, with any others following in their current order"""
+        order = OrderedDict((k, self._items[k]) for k in keys)
+        for k, c in self._items.items():
+            if k not in order:
+                order[k] = c
+        self._items = order
+        self._changed()
+
+    def relabel(self, child, old):
+        """Follow a change to the label of child from old
+
+        Notes
+        -----
+        A child stored under its old label, or under a generated key, is
+        stored under its new label, or under a generated key if that's
+        empty or taken. Its position is kept. Children stored under other
+        keys keep them.
+        """
+        key = self.key_of(child)
+        if key != old and not isinstance(key, int):
+            return key
+        new = getattr(child, 'label', None) or None
+        if new is None or new in self._items:
+            if isinstance(key, int):
+                return key
+            new = self._generate_key()
+        self._items = OrderedDict((new if k == key else k, c)
+                                  for k, c in self._items.items())
+        self._keys[id(child)] = new
+        self._changed()
+        return new
+
+    def move_to_end(self, key):
+        """Move the child stored under key to the end (drawn on top)"""
+        self._items[key] = self._items.pop(key)
+        self._changed()
+
+class Children(Instance):
+    """A trait holding a ChildStore, which also accepts lists of children"""
+
+    def __init__(self, **metadata):
+        super(Children,self).__init__(ChildStore, args=(), **metadata)
+
+    def validate(self, obj, value):
+        if isinstance(value, (list, tuple)):
+            value = ChildStore(value)
+        return super(Children,self).validate(obj, value)
 
 #-----------------------------------------------------------------------------
 # Collections and Selectors
@@ -425,12 +1116,28 @@ class SelectionMixin(object):
             return Collection(collect_all(self,cs))
 
 class Registry(HasTraits):
+    """Weak references to items of a type, in the order they were added
+
+    Notes
+    -----
+    References are dropped as their items die: each one is removed from
+    the index behind `in` when its item is collected, and the list of
+    references is compacted once at least compact_min of them, and half
+    of them, are dead. Compacting replaces the list rather than changing
+    it, so iterations in progress aren't affected.
+    """
 
     klass = Type(allow_none=True)
+    # the number of dead references which may trigger a compaction
+    compact_min = 64
 
     def __init__(self, items, type, *args, **kwargs):
         super(Registry,self).__init__(*args, **kwargs)
-        self._children = []
+        # set directly, since MutableRegistryMixin passes attributes to members
+        self.__dict__['_children'] = []
+        self.__dict__['_index'] = {}
+        self.__dict__['_dead'] = 0
+        self.__dict__['_callback'] = _reference_callback(self)
         self.klass = type
         self.extend(items)
 
@@ -441,15 +1148,39 @@ class Registry(HasTraits):
     @children.setter
     def children(self, value):
         if self.verify(*value):
-            self._children = value
+            self.__dict__['_children'] = []
+            self.__dict__['_index'] = {}
+            self.__dict__['_dead'] = 0
+            self.extend(value)
         else:
             self.error()
 
+    def __contains__(self, item):
+        ref = self._index.get(id(item))
+        return ref is not None and ref() is item
+
+    def _reference(self, item):
+        """Returns a weak reference to item, indexed and reported when it dies"""
+        ref = weakref.KeyedRef(item, self._callback, id(item))
+        self._index[id(item)] = ref
+        return ref
+
+    def _reference_died(self, ref):
+        if self._index.get(ref.key) is ref:
+            del self._index[ref.key]
+        self.__dict__['_dead'] += 1
+        if self._dead >= self.compact_min and 2*self._dead >= len(self._children):
+            self.compact()
+
+    def compact(self):
+        """Drop the references to dead items"""
+        self.__dict__['_children'] = [r for r in self._children if r() is not None]
+        self.__dict__['_dead'] = 0
+
     def append(self, item):
         """Append an item to children."""
         if self.verify(item):
-            ref = weakref.ref(item)
-            self._children.append(ref)
+            self._children.append(self._reference(item))
         else:
             self.error()
 
@@ -464,7 +1195,7 @@ class Registry(HasTraits):
     def extend(self, items):
         """Add the elements of items to self.children"""
         if self.verify(*items):
-            self._children.extend([weakref.ref(i) for i in items])
+            self._children.extend([self._reference(i) for i in items])
 
     def error(self):
         e = ('The elements of self.children must'
@@ -507,6 +1238,106 @@ class MutableRegistryMixin(HasTraits):
             value = trait_values[name]
             setattr(self,name,value)
 
+    @queued
+    def transform(self, *functions):
+        """Apply transforms to every element in one vectorized step
+
+        Parameters
+        ----------
+        *functions : tuple
+            3x3 matrices or tuples like ('rotate', 30) composed left to
+            right (see `compose_transforms`).
+
+        Notes
+        -----
+        The transform is applied on top of each element's existing one,
+        as DisplayMixin.apply_transform would, but the matrices of all the
+        elements are composed and rendered as arrays, and each root SVG's
+        widget is updated once.
+        """
+        elements = [ref() for ref in self.children]
+        for e in elements:
+            if not isinstance(e, DisplayMixin):
+                raise TypeError('{0} cannot be transformed'.format(e))
+        if len(elements) == 0:
+            return
+        m = compose_transforms(functions)
+        identity = np.identity(3)
+        applied = np.array([identity if e._applied_matrix is None
+                            else e._applied_matrix for e in elements])
+        own = np.array([identity if e._own_matrix is None
+                        else e._own_matrix for e in elements])
+        applied = np.einsum('ij,njk->nik', m, applied)
+        total = np.einsum('nij,njk->nik', applied, own)
+        rendered = render_matrices(total)
+        roots = {}
+        for i, e in enumerate(elements):
+            e._write_transform(applied[i], total[i], rendered[i])
+            root = e.root
+            roots[id(root)] = root
+        for root in roots.values():
+            if isinstance(root, SVG) and root._has_views():
+                root._notify_widget()
+
+    def to_columns(self, *names):
+        """Returns a dict of Data trait names to lists of their values
+
+        Parameters
+        ----------
+        *names : tuple
+            the traits to read. Defaults to the Data traits shared by all
+            the elements in self.children.
+
+        Notes
+        -----
+        Values are read in one pass over the elements from the cache behind
+        each element's `data` (see data_cache), in the order of self.children.
+        """
+        elements = [ref() for ref in self.children]
+        caches = [data_cache(e) for e in elements]
+        if not names:
+            shared = None
+            for e in elements:
+                found = set(data_names(type(e)))
+                shared = found if shared is None else shared & found
+            names = sorted(shared or ())
+        columns = OrderedDict((name, []) for name in names)
+        for e, cache in zip(elements, caches):
+            for name, column in columns.items():
+                try:
+                    column.append(cache[name])
+                except KeyError:
+                    raise TraitError('{0} is not a data attribute of {1}'.format(name, e))
+        return columns
+
+    def to_numpy(self, *names):
+        """Returns a dict of Data trait names to arrays of their values
+
+        Notes
+        -----
+        Columns are read as in to_columns. Lengths are converted to floats
+        in user units (NaN where relative, see `lengths_to_floats`), and
+        other columns are converted with np.asarray, falling back to arrays
+        of objects for values of uneven shape (e.g. lists of points).
+        """
+        columns = self.to_columns(*names)
+        children = self.children
+        traits = children[0]().traits() if children else {}
+        arrays = OrderedDict()
+        for name, values in columns.items():
+            trait = traits.get(name)
+            if isinstance(getattr(trait, 'trait', None), Length):
+                arrays[name] = lengths_to_floats(values)
+                continue
+            try:
+                arrays[name] = np.asarray(values)
+            except ValueError:
+                array = np.empty(len(values), dtype=object)
+                for i, v in enumerate(values):
+                    array[i] = v
+                arrays[name] = array
+        return arrays
+
     def has_traits(self, trait_name, error=False):
         """Check if the given name is a trait of the elements in self.children
 
@@ -530,8 +1361,7 @@ class MutableRegistryMixin(HasTraits):
     def append(self, item):
         """Append an item to self.children."""
         if self.verify(item):
-            ref = weakref.ref(item)
-            self._children.append(ref)
+            self._children.append(self._reference(item))
         else:
             self.error()
 
@@ -550,6 +1380,126 @@ class Collection(MutableRegistryMixin, SelectionMixin, Registry):
 class Composite(MutableRegistryMixin, SelectionMixin, MixedRegistry):
     pass
 
+class LiveCollection(Collection):
+    """A Collection whose members are kept up to date (see Element.watch_all)
+
+    Parameters
+    ----------
+    scope : Element
+        the element whose descendants are watched
+    selectors : list
+        the Selectors which members must match
+    metadata : dict or None
+        trait metadata which selected traits must have (see select_all)
+
+    Notes
+    -----
+    Members are weakly referenced and ordered by when they came to match.
+    The elements of the scope report trait changes and the children they
+    gain and lose (see BaseElement._watch_changed), and only those elements
+    are matched again. Selectors whose values are Selectors match against
+    parents, so with those the descendants of a changed element are also
+    matched again.
+    """
+
+    def __init__(self, scope, selectors, metadata=None, *args, **kwargs):
+        # set directly, since MutableRegistryMixin passes attributes to members
+        self.__dict__['_members'] = OrderedDict()
+        self.__dict__['_scope'] = weakref.ref(scope)
+        self.__dict__['_selectors'] = selectors
+        self.__dict__['_selector'] = CompositeSelector(selectors, metadata=metadata)
+        self.__dict__['_nested'] = any(isinstance(s._value, Selector) for s in selectors)
+        items = collect_all(scope, self._selector)
+        super(LiveCollection,self).__init__(items, *args, **kwargs)
+
+    @property
+    def children(self):
+        return [ref for ref in self._members.values() if ref() is not None]
+
+    def __contains__(self, element):
+        ref = self._members.get(id(element))
+        return ref is not None and ref() is element
+
+    def _reference_died(self, ref):
+        if self._index.get(ref.key) is ref:
+            del self._index[ref.key]
+        if self._members.get(ref.key) is ref:
+            self.__dict__['_dead'] += 1
+        if self._dead >= self.compact_min and 2*self._dead >= len(self._members):
+            self.compact()
+
+    def compact(self):
+        """Drop the members which have died"""
+        self.__dict__['_members'] = OrderedDict(
+            (k, r) for k, r in self._members.items() if r() is not None)
+        self.__dict__['_dead'] = 0
+
+    def append(self, item):
+        """Add item to the members if it isn't one already"""
+        if not self.verify(item):
+            self.error()
+        if item not in self:
+            ref = self._members.get(id(item))
+            if ref is not None:
+                # a dead member whose id has been reused
+                self.__dict__['_dead'] -= 1
+            self._members[id(item)] = self._reference(item)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def discard(self, item):
+        """Remove item from the members if it's one of them"""
+        if item in self:
+            del self._members[id(item)]
+            self._index.pop(id(item), None)
+
+    def _update(self, element, removed=False, structural=False):
+        """Match element (and possibly its descendants) again after a change"""
+        scope = self._scope()
+        if scope is None:
+            return
+        if removed:
+            for e in self._candidates(element, scope):
+                self.discard(e)
+            return
+        if structural or self._nested:
+            candidates = self._candidates(element, scope)
+        elif isinstance(element, Group) or element is scope:
+            return
+        else:
+            candidates = (element,)
+        for e in candidates:
+            if (self._attached(e, scope) and self.verify(e)
+                and self._selector.match(e)):
+                self.append(e)
+            else:
+                self.discard(e)
+
+    def _candidates(self, element, scope):
+        """Yield the elements under element which collect_all would match"""
+        stack = [element]
+        while stack:
+            e = stack.pop()
+            if isinstance(e, Group) or e is scope:
+                stack.extend(reversed(e.children))
+            else:
+                yield e
+
+    def _attached(self, element, scope):
+        """Returns True if element is reached from scope through groups"""
+        child, parent = element, element.parent
+        while parent is not None:
+            if child not in parent.children:
+                return False
+            if parent is scope:
+                return True
+            if not isinstance(parent, Group):
+                return False
+            child, parent = parent, parent.parent
+        return False
+
 class CompositeSelector(ImmutableRegistryMixin, MixedRegistry):
 
     def match(self, element):
@@ -563,9 +1513,8 @@ class CompositeSelector(ImmutableRegistryMixin, MixedRegistry):
     def append(self, item):
         """Add a selector to self.children."""
         if self.verify(item):
-            ref = weakref.ref(item)
-            ref().metadata = self.metadata
-            self._children.append(ref)
+            item.metadata = self.metadata
+            self._children.append(self._reference(item))
         else:
             self.error()
 
@@ -576,22 +1525,28 @@ class CompositeSelector(ImmutableRegistryMixin, MixedRegistry):
 
 class BaseElement(HasTraits):
 
-    data = DataDict()
+    # traits with `fingerprint=False` don't contribute to self.fingerprint
+    data = DataDict(fingerprint=False)
     klass = Type()
     tag = Unicode()
     template = Unicode()
-    parent = Instance('%s.BaseElement' % __name__, allow_none=True)
+    parent = Instance('%s.BaseElement' % __name__, allow_none=True, fingerprint=False)
     # traits with `linked=False` are not associated with
     # the self.data dictionary through a change handler
     # even though they have metadata for `attr`
     label = Unicode(attr='id', linked=False) # acts like html id
     kind = Unicode(attr='class', linked=False) # acts like html class
     templ_form = Template('')
+    # cached digests of self (see fingerprint)
+    _fingerprint = None
+    _own_digest = None
+    # the LiveCollections watching self (see Element.watch_all)
+    _watchers = None
+    # the tag, id and class index of a root (see Element.query)
+    _query_index = None
     
-    def __init__(self,*args,**kwargs):
-        super(BaseElement,self).__init__(*args,**kwargs)
-        self.on_trait_change(self.update_template,self.trait_names(attr=True))
-        self.klass = type(self)
+    def _klass_default(self):
+        return type(self)
 
     def declare(self, **new_traits):
         """Reassigns new trait values to self
@@ -605,6 +1560,7 @@ class BaseElement(HasTraits):
         for name in new_traits.keys():
             setattr(self, name, new_traits[name])
 
+    @handles(attr=True)
     def update_template(self):
         """Reevaluate template with self._template_default"""
         self.template = self._template_default()
@@ -621,19 +1577,20 @@ class BaseElement(HasTraits):
         Traits which pass `attr=<string>` to **metadata will still gather
         placeholders from self.trait_names(), however the attribute name for
         that placeholder will be set as the string passed to attr.
+        Otherwise underscores in trait names become dashes in attribute
+        names (e.g. stroke_width is rendered as stroke-width).
         """
         attr_temps = []
-        anyattr = lambda v: False if v is None else True
-        traits = self.traits(attr=anyattr)
+        traits = attr_traits(type(self))
         for name in traits.keys():
-            if self._trait_values[name] is not None:
+            if getattr(self, name) is not None:
                 trait_metadata = getattr(traits[name], 'metadata')
                 if isinstance(trait_metadata['attr'],str):
                     attr_temps.append('{0}="{{{1}}}"'.format(trait_metadata['attr'],name))
                 elif trait_metadata.get('raw',False):
-                    attr_temps.append('{0}={{{0}}}'.format(name))
+                    attr_temps.append('{0}={{{1}}}'.format(name.replace('_','-'),name))
                 else:
-                    attr_temps.append('{0}="{{{0}}}"'.format(name))
+                    attr_temps.append('{0}="{{{1}}}"'.format(name.replace('_','-'),name))
         return self.templ_form.safe_substitute(tag=self.tag, attrs=' '.join(attr_temps))
 
     def handle_value(self,name):
@@ -644,7 +1601,59 @@ class BaseElement(HasTraits):
         The output from self.handle_value directly substitutes place holders
         generated in self._template_default when rendering the final template.
         """
-        return getattr(self,name)
+        return self._format_value(name, self._raw_value(name))
+
+    # placeholders whose raw value isn't just their trait (see _raw_value)
+    _context_fields = ()
+
+    def _raw_value(self, name):
+        """Returns what _format_value needs to render the placeholder name"""
+        return getattr(self, name)
+
+    def _raw_values(self, names):
+        """Returns the raw values of the placeholders names (see _describe)"""
+        values = self._trait_values
+        context = self._context_fields
+        return tuple(values[name] if name in values and name not in context
+                     else self._raw_value(name) for name in names)
+
+    @classmethod
+    def _format_value(cls, name, value):
+        """Returns the text of a placeholder from its raw value
+
+        Notes
+        -----
+        Formatting is kept apart from the instance, so that SVG.parallel
+        can do it in its pool from the values _describe gathers.
+        """
+        return value
+
+    @classmethod
+    def _format_values(cls, names, raw):
+        """Returns the text of the placeholders names from their raw values"""
+        format_value = cls._format_value
+        return dict((name, format_value(name, value)) for name, value in zip(names, raw))
+
+    def _render_attributes(self):
+        """Returns the attributes of self as rendered, as {name: value}
+
+        Notes
+        -----
+        Attributes are those placed in the template by _template_default,
+        with their values from self.handle_value (see SVG.record).
+        """
+        attrs = {}
+        for name, trait in attr_traits(type(self)).items():
+            if getattr(self, name) is None:
+                continue
+            attr = trait.metadata['attr']
+            if not isinstance(attr, str):
+                attr = name
+            value = unicode(self.handle_value(self.handle_name(name)))
+            if trait.metadata.get('raw', False):
+                value = value[1:-1]
+            attrs[attr.replace('_','-')] = value
+        return attrs
 
     def handle_name(self,name):
         """Given a trait name return a formated string.
@@ -661,21 +1670,230 @@ class BaseElement(HasTraits):
         
         Notes
         -----
-        All names passed to self.handle_value are taken from self.trait_names(),
-        and all underscores (`_`) in self.trait_names() will be replaced with
-        dashes (`-`) for formatting purposes.
+        All names passed to self.handle_value are taken from self.trait_names().
+        Values are placed as they are, so handle_value is responsible for
+        escaping them (see Text).
         """
         keys = [self.handle_name(name) for name in self.trait_names()]
         vals = [self.handle_value(name) for name in keys]
         data = dict(zip(keys,vals))
-        return self.template.format(**data).replace('_','-')
+        return self.template.format(**data)
 
     def _repr_svg_(self):
         return self._render_template()
 
+    def _describe(self, viewport=None, shared=None):
+        """Returns (class, template, raw, children) for render_description
+
+        Parameters
+        ----------
+        viewport : tuple or None
+            children outside this box are left out (see SVG.culling)
+        shared : dict or None
+            used to share equal templates between descriptions, so they're
+            only pickled once
+
+        Notes
+        -----
+        Only the raw values of the placeholders of self.template are
+        gathered (see _raw_values), mostly straight from the trait values,
+        and formatting them is left to render_description, so describing a
+        tree costs little more than walking it.
+        """
+        template = self.template
+        if shared is not None:
+            template = shared.setdefault(template, template)
+        names = value_fields(template)
+        children = None
+        if '{children}' in template:
+            children = [c._describe(viewport, shared) for c in self.children
+                        if viewport is None or _in_view(c, viewport)]
+        return (type(self), template, self._raw_values(names), children)
+
+    def __setattr__(self, name, value):
+        # only traits are queued, so private state is set straight away
+        if (MutationQueue.active and '_trait_values' in self.__dict__
+            and self.has_trait(name)):
+            # attaching a new element to a tree counts as a change to that tree
+            element = value if name == 'parent' and value is not None else self
+            queue = getattr(element.root, '_mutation_queue', None)
+            if queue is not None and not queue.is_owner():
+                queue.put(setattr, self, name, value)
+                return
+        super(BaseElement,self).__setattr__(name, value)
+
+    def _notify_trait(self, name, old, new):
+        self._call_handlers(name, old, new)
+        super(BaseElement,self)._notify_trait(name, old, new)
+        if self.trait_metadata(name, 'fingerprint') is not False:
+            self._fingerprint_changed(own=True)
+        elif name == 'children':
+            self._fingerprint_changed()
+        elif name == 'parent' and new is not None:
+            new._fingerprint_changed()
+        if name == 'label' and self.parent is not None and self in self.parent.children:
+            self.parent.children.relabel(self, old)
+        if name != 'template':
+            self._spatial_changed(self)
+            self._watch_trait(name, old, new)
+
+    def _call_handlers(self, name, old, new):
+        """Call the class-level handlers (see handles) and data handler of a trait"""
+        for method, takes_args in trait_handlers(type(self)).get(name, ()):
+            if takes_args:
+                getattr(self, method)(name, old, new)
+            else:
+                getattr(self, method)()
+        handlers = self.__dict__.get('_data_handlers')
+        if handlers is not None and name in handlers:
+            handlers[name](name, old, new)
+
+    def fingerprint(self):
+        """Returns a hex digest identifying what self renders
+
+        Notes
+        -----
+        The digest covers the type of self and the repr of each trait value
+        (except those with `fingerprint=False` metadata), and for elements
+        the fingerprints of their children in order, making it a Merkle hash
+        of the subtree. Digests are cached, and a change clears them only on
+        the path up to the root, so only that path is hashed again.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = self._subtree_digest()
+        return self._fingerprint
+
+    def _subtree_digest(self):
+        return self._own_fingerprint()
+
+    def _own_fingerprint(self):
+        """Returns the digest of the traits of self alone"""
+        if self._own_digest is None:
+            cls = type(self)
+            names = cls.__dict__.get('_fingerprint_names')
+            if names is None:
+                names = sorted(self.trait_names(fingerprint=lambda v: v is not False))
+                cls._fingerprint_names = names
+            parts = [cls.__name__]
+            for name in names:
+                parts.append(u'{0}={1!r}'.format(name, getattr(self, name)))
+            self._own_digest = digest(*parts)
+        return self._own_digest
+
+    def _fingerprint_changed(self, own=False):
+        """Clear the cached fingerprints of self and its parents
+
+        Notes
+        -----
+        A cached fingerprint implies cached fingerprints for all of its
+        descendants, so clearing stops at the first parent without one.
+        """
+        if own:
+            self._own_digest = None
+        element = self
+        while element is not None and element._fingerprint is not None:
+            element._fingerprint = None
+            element = element.parent
+
+    def _watch_trait(self, name, old, new):
+        """Report a trait change to the live collections watching self"""
+        if name == 'children':
+            for c in old or ():
+                if c not in new:
+                    c._watch_changed(removed=True)
+        self._watch_changed(structural=name in ('parent', 'children'))
+
+    def _watch_changed(self, removed=False, structural=False):
+        """Let the live collections of self and its parents match self again
+
+        Parameters
+        ----------
+        removed : bool
+            self and its descendants were removed from the tree
+        structural : bool
+            self was added to the tree, or its children were replaced
+        """
+        element = self
+        while element is not None:
+            if element._watchers:
+                for live in list(element._watchers):
+                    live._update(self, removed, structural)
+            element = element.parent
+
+    def _spatial_changed(self, element):
+        """Mark element as needing to be re-indexed by the root's spatial index"""
+        root = self.root
+        if getattr(root, '_spatial_index', None) is not None:
+            root._spatial_dirty.add(element)
+
+    def _spatial_removed(self, element):
+        """Drop element and its descendants from the root's spatial index"""
+        root = self.root
+        index = getattr(root, '_spatial_index', None)
+        if index is not None:
+            for leaf in iter_leaves(element):
+                index.discard(leaf)
+                root._spatial_dirty.discard(leaf)
+            root._spatial_dirty.discard(element)
+
+    @property
+    def root(self):
+        """The top-most parent of self (self if there is no parent)"""
+        element = self
+        while element.parent is not None:
+            element = element.parent
+        return element
+
+    def bbox(self):
+        """Returns the (x0, y0, x1, y1) extent of self in user units
+
+        Notes
+        -----
+        The extent is given in the user units of the root element, that is
+        after applying the transforms of self and all its parents. None is
+        returned whenever the extent can't be determined, in which case self
+        is never culled from the rendered output.
+        """
+        box = self._local_bbox()
+        if box is None:
+            return None
+        matrix = self.ctm()
+        if matrix is not None:
+            box = transform_bbox(matrix, box)
+        return box
+
+    def ctm(self):
+        """Returns the 3x3 matrix from user units of self to those of the root
+
+        Notes
+        -----
+        None is returned if neither self nor its parents are transformed.
+        """
+        matrix = None
+        element = self
+        while element is not None:
+            m = getattr(element, '_transform_matrix', None)
+            if m is not None:
+                matrix = m if matrix is None else m.dot(matrix)
+            element = element.parent
+        return matrix
+
+    def _local_bbox(self):
+        """Returns the untransformed extent of self (None if unknown)"""
+        return None
+
+    def _restore(self, values):
+        """Write trait values from a snapshot straight into self (see SVG.restore)"""
+        for name, value in values.items():
+            self._trait_values[name] = value
+        clear_data_cache(self)
+        self.update_template()
+
 class Element(SelectionMixin,BaseElement):
 
-    children = List()
+    children = Children(fingerprint=False)
+    # the children bound to data by self.join, by class and then key
+    _joins = None
     templ_form = Template('<$tag $attrs>\n{children}\n</$tag>')
 
     def handle_value(self,name):
@@ -687,28 +1905,294 @@ class Element(SelectionMixin,BaseElement):
         generated in self._template_default when rendering the final template.
         """
         if name == 'children':
-            return u'\n'.join([c._render_template() for c in self.children])
+            return self._render_children()
         else:
-            value = getattr(self,name)
-            if value is None:
-                return ""
-            else:
-                return value
+            return self._format_value(name, getattr(self,name))
 
-    def extend(self,children):
-        """Extend self.children by children"""
-        for c in children:
-            self.append(c)
+    @classmethod
+    def _format_value(cls, name, value):
+        return "" if value is None else value
 
-    def append(self,child):
-        """Add a child to self.children"""
-        self.children.append(child)
+    def _subtree_digest(self):
+        children = [c.fingerprint() for c in self.children]
+        return digest(self._own_fingerprint(), *children)
 
-    def Circle(self,**kwargs):
-        """Add a circle to self.children"""
-        c = Circle(parent=self, **kwargs)
-        self.append(c)
-        return c
+    def _render_template(self):
+        """Render self, or take it from the root's render_cache if it has one
+
+        Notes
+        -----
+        The root is never cached, since any change renders it again. Other
+        elements are stored when they miss, so a later render (in this or
+        another process) of an unchanged subtree is served from the cache,
+        and entries which aren't used again are evicted as the cache fills.
+        """
+        root = self.root
+        cache = getattr(root, 'render_cache', None)
+        if cache is None or root is self:
+            return super(Element,self)._render_template()
+        key = self._render_key(root)
+        rendered = cache.get(key)
+        if rendered is None:
+            rendered = super(Element,self)._render_template()
+            cache.put(key, rendered)
+        return rendered
+
+    def _render_key(self, root):
+        """Returns the render cache key of self
+
+        Notes
+        -----
+        Culling, level of detail and simplification depend on the view of
+        the root SVG and the transforms above self, so those are hashed
+        along with self.fingerprint().
+        """
+        view = ''
+        if isinstance(root, SVG):
+            matrix = self.ctm()
+            if matrix is not None:
+                matrix = matrix.tolist()
+            view = repr((root.viewport(), root.pixel_scale(), root.culling,
+                         root.lod_threshold, matrix))
+        return digest(self.fingerprint(), view)
+
+    def _render_children(self):
+        """Render self.children, letting the root SVG cull what isn't visible"""
+        root = self.root
+        if isinstance(root, SVG):
+            rendered = root._render_visible(self)
+        else:
+            rendered = [c._render_template() for c in self.children]
+        return u'\n'.join(rendered)
+
+    def bbox(self):
+        """Returns the union of the bounding boxes of self.children"""
+        return bbox_union(c.bbox() for c in self.children)
+
+    def extend(self,children):
+        """Extend self.children by children"""
+        for c in children:
+            self.append(c)
+
+    @queued
+    def append(self,child):
+        """Add a child to self.children"""
+        self.children.append(child)
+        self._spatial_changed(child)
+        self._fingerprint_changed()
+        child._watch_changed(structural=True)
+
+    @queued
+    def remove(self, *children):
+        """Remove the given children (or the children with the given keys)"""
+        for c in children:
+            if not isinstance(c, BaseElement):
+                key, c = c, self.children.get(c)
+                if c is None:
+                    raise KeyError(key)
+            self.children.remove(c)
+            self._spatial_removed(c)
+            c._watch_changed(removed=True)
+        self._fingerprint_changed()
+        self._notify_children()
+
+    def memory_report(self):
+        """Returns the approximate memory held by self and its descendants
+
+        Notes
+        -----
+        Bytes are given by element class and by category (traits,
+        notifiers, templates, caches and so on, see `memory_report`), so
+        tests can assert budgets like
+        `view.memory_report()['categories']['notifiers'] < 2**20`.
+        Print `format_memory_report(view.memory_report())` for a table.
+        """
+        return memory_report(self)
+
+    def watch_all(self, *trait_names, **kwargs):
+        """Returns a LiveCollection of all elements having the given trait names, values, and metadata
+
+        Parameters
+        ----------
+        trait_names : tuple
+            Should contain trait names which will be selected for.
+        kwargs : dict
+            Should contain trait names and values which will be
+            selected for, as in self.select_all (without 'validate'
+            or 'strict_validate').
+
+        Notes
+        -----
+        Unlike select_all, the collection keeps itself up to date as the
+        descendants of self change, are added and are removed, at a cost
+        proportional to those changes rather than to the size of the tree.
+        It stops being updated once it's garbage collected.
+        """
+        kwargs['metadata'] = kwargs.get('metadata',None)
+        selectors = generate_selectors(*trait_names, **kwargs)
+        live = LiveCollection(self, selectors, kwargs['metadata'])
+        if self._watchers is None:
+            self._watchers = weakref.WeakSet()
+        self._watchers.add(live)
+        return live
+
+    def query(self, selector):
+        """Returns a Collection of the descendants of self matching a CSS selector
+
+        Parameters
+        ----------
+        selector : str
+            e.g. 'g[stroke=blue] > circle.marker#a' (see `compile_query`
+            for what's supported). Ids are labels and classes are kinds.
+
+        Notes
+        -----
+        Selectors are parsed once and cached. Candidates are looked up by
+        id, class or tag in an index kept on the root, which is built on the
+        first query and then updated as the tree changes; only selectors
+        without any of those scan every descendant. Elements are returned in
+        document order, and unlike select_all groups can be selected too.
+        """
+        plan = compile_query(selector)
+        root = self.root
+        index = root._query_index
+        if index is None:
+            index = root._query_index = QueryIndex(root)
+            if root._watchers is None:
+                root._watchers = weakref.WeakSet()
+            root._watchers.add(index)
+        return Collection(run_query(plan, self, index))
+
+    def get(self, key, default=None):
+        """Returns the child stored under key (see ChildStore)"""
+        return self.children.get(key, default)
+
+    @queued
+    def replace(self, old, new):
+        """Put the child new in place of old (a child or a key)
+
+        Notes
+        -----
+        new takes over the key and position of old.
+        """
+        if not isinstance(old, BaseElement):
+            old = self.children.get(old)
+        self.children.replace(old, new)
+        if new.parent is not self:
+            new.parent = self
+        self._spatial_removed(old)
+        self._spatial_changed(new)
+        self._fingerprint_changed()
+        old._watch_changed(removed=True)
+        new._watch_changed(structural=True)
+        self._notify_children()
+
+    @queued
+    def reorder(self, keys):
+        """Render the children with the given keys first, in that order"""
+        self.children.reorder(keys)
+        self._fingerprint_changed()
+        self._watch_changed(structural=True)
+        self._notify_children()
+
+    def _notify_children(self):
+        """Tell the root's widget that self.children has changed"""
+        root = self.root
+        if isinstance(root, SVG) and root._has_views():
+            root._notify_widget()
+
+    @queued
+    def join(self, data, key=None, kind='circle', **attrs):
+        """Bind rows of data to children, creating, updating and removing them
+
+        Parameters
+        ----------
+        data : DataFrame, dict, structured array, or list of dicts
+            the rows to bind (see `data_columns`)
+        key : str, callable, or None
+            the column holding each row's key, or a function of the row
+            (as a dict) returning it. Rows are keyed by position if None.
+        kind : str or type
+            the element type to join with (e.g. 'circle' or Circle)
+        **attrs : dict
+            trait names mapped to a column name, a function of the row, or
+            a constant value.
+
+        Returns
+        -------
+        A Collection of the joined children, in the order of the rows.
+
+        Notes
+        -----
+        Like a d3 data join, rows whose key matches a previous join of the
+        same kind on self update that element, setting only the traits whose
+        value changed; new keys create elements and missing keys remove them.
+        All changes are sent to the widget in one update.
+        """
+        if isinstance(kind, (str, unicode)):
+            klass = ELEMENT_TYPES[kind.lower()]
+        else:
+            klass = kind
+        columns, n = data_columns(data)
+        rows = None
+        if callable(key) or any(callable(v) for v in attrs.values()):
+            names = list(columns.keys())
+            rows = [dict(zip(names, r)) for r in zip(*[columns[c] for c in names])]
+        if key is None:
+            keys = list(range(n))
+        elif callable(key):
+            keys = [key(row) for row in rows]
+        else:
+            keys = columns[key]
+        values = {}
+        for name, value in attrs.items():
+            if callable(value):
+                values[name] = [value(row) for row in rows]
+            elif isinstance(value, (str, unicode)) and value in columns:
+                values[name] = columns[value]
+            else:
+                values[name] = [value]*n
+        if len(set(keys)) != n:
+            raise ValueError('the keys of a join must be unique')
+
+        if self._joins is None:
+            self._joins = {}
+        # copied, so a join which raises leaves the last one's bindings
+        previous = dict(self._joins.get(klass, {}))
+        joined = {}
+        children = []
+        root = self.root
+        hold = root.hold_sync() if isinstance(root, SVG) else _null_context()
+        with hold:
+            for i, k in enumerate(keys):
+                datum = dict((name, values[name][i]) for name in values)
+                child = previous.pop(k, None)
+                if child is not None and child not in self.children:
+                    # removed since the last join, so it's made again
+                    child = None
+                if child is None:
+                    child = klass(parent=self)
+                    self.append(child)
+                    child.declare(**datum)
+                else:
+                    old = child._join_datum
+                    changed = dict((name, v) for name, v in datum.items()
+                                   if name not in old or old[name] != v)
+                    child.declare(**changed)
+                child._join_datum = datum
+                joined[k] = child
+                children.append(child)
+            stale = [c for c in previous.values() if c in self.children]
+            if stale:
+                self.remove(*stale)
+        self._joins[klass] = joined
+        return Collection(children)
+
+    def Circle(self,**kwargs):
+        """Add a circle to self.children"""
+        c = Circle(parent=self, **kwargs)
+        self.append(c)
+        return c
 
     def Ellipse(self,**kwargs):
         """Add an ellipse to self.children"""
@@ -740,6 +2224,14 @@ class Element(SelectionMixin,BaseElement):
         self.append(t)
         return t
 
+    def Labels(self, **kwargs):
+        """Add many text labels to self.children as one element (see Labels)"""
+        root = self.root
+        with root.hold_sync() if isinstance(root, SVG) else _null_context():
+            labels = Labels(parent=self, **kwargs)
+            self.append(labels)
+        return labels
+
     def Group(self,**kwargs):
         """Add a group to self.children"""
         g = Group(parent=self, **kwargs)
@@ -761,6 +2253,28 @@ class SVG(Element):
     tag = Unicode('svg')
     width = Data(Length(100), attr=True)
     height = Data(Length(100), attr=True)
+    viewBox = Data(ViewBox(None, allow_none=True), attr=True, allow_none=True)
+    # skip rendering children whose bounding box is outside the viewport
+    culling = Bool(False)
+    # shapes smaller than this many pixels are aggregated (0 disables)
+    lod_threshold = Float(0)
+    # a RenderCache consulted before rendering each element (None disables)
+    render_cache = Instance(RenderCache, allow_none=True, fingerprint=False)
+    _spatial_index = None
+    _widget = None
+    # other widgets showing self, held weakly (see views)
+    _views = None
+    # the Recorders writing the frames of self (see record)
+    _recorders = ()
+    # the process pool rendering large documents (see parallel)
+    _pool = None
+    _pool_chunks = 0
+    _pool_min = 0
+    _sync_hold = 0
+    _sync_pending = False
+    _mutation_queue = None
+    # the view whose navigation is being taken on (see _navigated)
+    _navigated_view = None
 
     def __init__(self,*args,**kwargs):
         super(SVG,self).__init__(*args,**kwargs)
@@ -768,40 +2282,660 @@ class SVG(Element):
         if global_sync.get() and local_sync:
             self._widget = SVGWidget(self)
 
+    @queued
     def append(self,child):
         """Add a child to self.children"""
         self.children.append(child)
-        self._notify_widget()
+        self._spatial_changed(child)
+        self._fingerprint_changed()
+        child._watch_changed(structural=True)
+        if self._has_views():
+            self._notify_widget()
+
+    def select_region(self, x0, y0, x1, y1):
+        """Returns a Collection of the elements overlapping a region
+
+        Parameters
+        ----------
+        x0, y0, x1, y1 : float
+            opposite corners of the region in the root's user units
+
+        Notes
+        -----
+        Only elements without children are selected, as with select_all.
+        Elements whose bounding box can't be determined are never selected.
+        See SVG.reindex for how the underlying spatial index is kept.
+        """
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        index = self._spatial_update()
+        return Collection(index.query(x0, y0, x1, y1))
+
+    def hit_test(self, x, y):
+        """Returns a Collection of the elements whose bounding box contains (x, y)
+
+        Notes
+        -----
+        Elements are in document order, so the last one is drawn on top.
+        """
+        index = self._spatial_update()
+        return Collection(index.point(x, y))
+
+    def reindex(self):
+        """Rebuild the spatial index used by select_region and hit_test
+
+        Notes
+        -----
+        The index is built on the first query and is then kept up to date
+        incrementally: elements whose traits change, and children added with
+        append, are re-indexed at the next query. Call this directly after
+        modifying `children` lists by hand.
+        """
+        leaves = []
+        boxes = []
+        for leaf in iter_leaves(self):
+            box = leaf.bbox()
+            if box is not None:
+                leaves.append(leaf)
+                boxes.append(box)
+        self._spatial_dirty = set()
+        self._spatial_index = GridIndex.from_boxes(leaves, boxes)
+        return self._spatial_index
+
+    def _spatial_update(self):
+        """Re-index the elements which changed since the last query"""
+        index = self._spatial_index
+        if index is None:
+            return self.reindex()
+        dirty, self._spatial_dirty = self._spatial_dirty, set()
+        for element in dirty:
+            for leaf in iter_leaves(element):
+                box = leaf.bbox()
+                if box is None:
+                    index.discard(leaf)
+                else:
+                    index.insert(leaf, box)
+        return index
+
+    def viewport(self):
+        """Returns the visible region as (x0, y0, x1, y1) in user units
+
+        Notes
+        -----
+        The region is taken from self.viewBox, expanded to account for the
+        default `xMidYMid meet` aspect ratio. Without a viewBox the region
+        spans (0, 0, width, height). None is returned if width or height
+        are relative lengths.
+        """
+        width = length_to_float(self.width)
+        height = length_to_float(self.height)
+        if self.viewBox is None:
+            if None in (width, height):
+                return None
+            return (0.0, 0.0, width, height)
+        x, y, w, h = [float(v) for v in self.viewBox.split()]
+        scale = self.pixel_scale()
+        if scale is not None:
+            dw, dh = width/scale - w, height/scale - h
+            x, y, w, h = x-dw/2, y-dh/2, w+dw, h+dh
+        return (x, y, x+w, y+h)
+
+    def pixel_scale(self):
+        """Returns the number of pixels per user unit, or None if unknown"""
+        width = length_to_float(self.width)
+        height = length_to_float(self.height)
+        if None in (width, height):
+            return None
+        if self.viewBox is None:
+            return 1.0
+        w, h = [float(v) for v in self.viewBox.split()[2:]]
+        if w <= 0 or h <= 0:
+            return None
+        return min(width/w, height/h)
+
+    def parallel(self, processes=None, min_elements=10000):
+        """Render the children of self in a pool of processes when there are many
+
+        Parameters
+        ----------
+        processes : int or None
+            the number of processes (the number of cpus if None). Passing 0
+            closes the pool and renders in this process again.
+        min_elements : int
+            documents with fewer elements than this are rendered here, so
+            small ones don't pay for sending them to the pool
+
+        Notes
+        -----
+        The children of self are split into runs of about equal size, two
+        per process. Each run is described as nested tuples of templates
+        and the raw values of their placeholders (see BaseElement._describe),
+        which the pool formats and renders with render_descriptions. The
+        results are joined in order.
+        Documents aggregating shapes (see lod_threshold) or using a
+        render_cache are always rendered here.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        if processes == 0:
+            return
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self._pool = multiprocessing.Pool(processes)
+        self._pool_chunks = 2*processes
+        self._pool_min = min_elements
+
+    def _render_children(self):
+        if (self._pool is not None and self.parent is None
+            and self.lod_threshold <= 0 and self.render_cache is None):
+            rendered = self._render_parallel()
+            if rendered is not None:
+                return rendered
+        return super(SVG,self)._render_children()
+
+    def _render_parallel(self):
+        """Render self.children in the pool, or return None if there are too few"""
+        viewport = self.viewport() if self.culling else None
+        children = [c for c in self.children if viewport is None
+                    or _in_view(c, viewport)]
+        sizes = [subtree_size(c) for c in children]
+        total = sum(sizes)
+        if total < self._pool_min or len(children) < 2:
+            return None
+        target = float(total)/self._pool_chunks
+        chunks, chunk, size = [], [], 0
+        for c, n in zip(children, sizes):
+            chunk.append(c)
+            size += n
+            if size >= target:
+                chunks.append(chunk)
+                chunk, size = [], 0
+        if chunk:
+            chunks.append(chunk)
+        shared = {}
+        descriptions = [[c._describe(viewport, shared) for c in chunk] for chunk in chunks]
+        return u'\n'.join(self._pool.map(render_descriptions, descriptions))
+
+    def _render_visible(self, element):
+        """Render the children of element which are inside the viewport
+
+        Notes
+        -----
+        When self.culling is True, children whose bounding box lies outside
+        self.viewport() are skipped. When self.lod_threshold is positive,
+        shapes smaller than that many pixels are binned into a grid of
+        threshold sized cells, and any cell holding more than one of them is
+        rendered as a single aggregate rect in place of its first member.
+        Shapes are only aggregated when element isn't transformed.
+        """
+        viewport = self.viewport() if self.culling else None
+        scale = self.pixel_scale() if self.lod_threshold > 0 else None
+        if scale is not None and element.ctm() is not None:
+            scale = None
+        if viewport is None and scale is None:
+            return [c._render_template() for c in element.children]
+        rendered = []
+        clusters = {}
+        for c in element.children:
+            box = c.bbox()
+            if box is None:
+                rendered.append(c._render_template())
+                continue
+            if viewport is not None and not bbox_intersects(box, viewport):
+                continue
+            if scale is not None and isinstance(c, Shape):
+                size = max(box[2]-box[0], box[3]-box[1])*scale
+                if size < self.lod_threshold:
+                    cell = (int(np.floor(box[0]*scale/self.lod_threshold)),
+                            int(np.floor(box[1]*scale/self.lod_threshold)))
+                    if cell not in clusters:
+                        clusters[cell] = (len(rendered), [])
+                        rendered.append(None)
+                    clusters[cell][1].append((c, box))
+                    continue
+            rendered.append(c._render_template())
+        for index, members in clusters.values():
+            if len(members) == 1:
+                rendered[index] = members[0][0]._render_template()
+            else:
+                rendered[index] = self._render_aggregate(members)
+        return rendered
+
+    def _render_aggregate(self, members):
+        """Render a list of (shape, bbox) pairs as one rect"""
+        x0, y0, x1, y1 = bbox_union(box for shape, box in members)
+        shape = members[0][0]
+        color = shape.fill
+        if color in (None, '', 'none'):
+            color = shape.stroke
+        return ('<rect class="lod" x="{0}" y="{1}" width="{2}" height="{3}"'
+                ' fill="{4}" stroke="none"/>'.format(format_number(x0),
+                format_number(y0), format_number(x1-x0),
+                format_number(y1-y0), color or 'black'))
 
     def _notify_trait(self, name, old, new):
+        self._call_handlers(name, old, new)
         super(BaseElement,self)._notify_trait(name, old, new)
-        if hasattr(self,'_widget'):
+        if self.trait_metadata(name, 'fingerprint') is not False:
+            self._fingerprint_changed(own=True)
+        elif name == 'children':
+            self._fingerprint_changed()
+        if name != 'template':
+            self._watch_trait(name, old, new)
+        if self._has_views():
             self._notify_widget()
 
+    @contextmanager
+    def hold_sync(self):
+        """Delay widget updates until the end of the block
+
+        Notes
+        -----
+        However many changes are made within the block, the widget is
+        updated once at its end. Blocks can be nested.
+        """
+        self._sync_hold += 1
+        try:
+            yield self
+        finally:
+            self._sync_hold -= 1
+            if self._sync_hold == 0 and self._sync_pending:
+                self._sync_pending = False
+                self._notify_widget()
+
     def _notify_widget(self):
-        w = self._widget
-        if w is not None:
-            w.notify()
-        else:
+        if self._sync_hold:
+            self._sync_pending = True
+            return
+        views = self.views
+        if not views and not self._recorders:
             raise AttributeError("no widget synced for '{0}'".format(self))
+        svg = self._repr_svg_() if views else None
+        for w in views:
+            if w is self._navigated_view:
+                w.adopt(svg)
+            else:
+                w.update(svg)
+        for recorder in self._recorders:
+            recorder.frame(svg)
+
+    def _record_frame(self):
+        """Write a frame to each recording, or once the hold_sync block ends"""
+        if self._sync_hold:
+            self._sync_pending = True
+            return
+        for recorder in self._recorders:
+            recorder.frame()
+
+    @property
+    def views(self):
+        """The widgets showing self, starting with its own
+
+        Notes
+        -----
+        Besides the widget an SVG makes for itself, any SVGWidget made for
+        it is attached (see attach) and gets the same updates: each change
+        is rendered once and the markup is sent to every view. Views other
+        than self's own are held weakly, and dropped when closed.
+        """
+        views = []
+        if self._widget is not None:
+            views.append(self._widget)
+        if self._views:
+            views.extend(w for w in self._views if w is not self._widget)
+        return views
+
+    def _navigated(self, widget, viewBox):
+        """Take on the viewBox a view was panned or zoomed to
+
+        Notes
+        -----
+        Views with `navigable` set pan and zoom by changing the viewBox of
+        the markup they show, and report the final viewBox once navigation
+        pauses. Other views are sent the markup as usual, but the view
+        navigated already shows it, unless what's rendered depends on the
+        viewBox (see culling and lod_threshold).
+        """
+        if self.culling or self.lod_threshold > 0:
+            self.viewBox = viewBox
+            return
+        self._navigated_view = widget
+        try:
+            self.viewBox = viewBox
+        finally:
+            self._navigated_view = None
+
+    def _has_views(self):
+        return (self._widget is not None or bool(self._views)
+                or bool(self._recorders))
+
+    def record(self, path):
+        """Record the changes to self in a file until the returned Recorder is closed
+
+        Notes
+        -----
+        Each widget update is a frame. The file starts with the whole
+        document, and frames hold only the attributes which changed, so
+        recording costs little more than looking at the changed elements
+        (see nbsvg.py.record.Recorder). Use replay_frames, replay or
+        export_html from nbsvg.py.record to play a recording back.
+        """
+        recorder = Recorder(self, path)
+        self._recorders = self._recorders + (recorder,)
+        if self._watchers is None:
+            self._watchers = weakref.WeakSet()
+        self._watchers.add(recorder)
+        return recorder
+
+    def _stop_recording(self, recorder):
+        self._recorders = tuple(r for r in self._recorders if r is not recorder)
+        if self._watchers is not None:
+            self._watchers.discard(recorder)
+
+    def attach(self, widget):
+        """Send the updates of self to widget as well"""
+        if self._views is None:
+            self._views = weakref.WeakSet()
+        self._views.add(widget)
+
+    def detach(self, widget):
+        """Stop sending updates of self to widget"""
+        if self._views is not None:
+            self._views.discard(widget)
+        if widget is self._widget:
+            self._widget = None
+
+    def snapshot(self):
+        """Returns self and its descendants encoded as compact binary
+
+        Notes
+        -----
+        All trait values are stored, along with path geometry and the
+        transforms from apply_transform, but not the widget, the
+        render_cache or the bindings made by Element.join. Numeric columns
+        are packed as arrays and strings are interned (see snapshot.dump).
+        """
+        nodes = []
+        stack = [(self, -1, None)]
+        while stack:
+            element, parent, key = stack.pop()
+            cls = type(element)
+            values = dict((name, getattr(element, name))
+                          for name in snapshot_names(cls))
+            name = snapshot_name(cls)
+            if SNAPSHOT_TYPES.get(name) is not cls:
+                raise snapshots.SnapshotError("'{0}' is not a registered element class "
+                                              "(see register_element)".format(name))
+            node = snapshots.Node(name, parent, key, values)
+            if isinstance(element, DisplayMixin):
+                applied = element._applied_matrix
+                if applied is not None:
+                    applied = tuple(applied[:2].T.ravel().tolist())
+                values['_applied_matrix'] = applied
+            if isinstance(element, Path):
+                buf = element._packed_buffer()
+                node.ops, node.coords = buf.ops, buf.coords
+            index = len(nodes)
+            nodes.append(node)
+            if isinstance(element, Element):
+                for key, child in reversed(element.children.items()):
+                    stack.append((child, index, key))
+        return snapshots.dump(nodes)
+
+    @classmethod
+    def restore(cls, buf):
+        """Build a new tree from the output of SVG.snapshot
+
+        Notes
+        -----
+        Elements are built with widget sync turned off, and their trait
+        values are written directly rather than through declare, so each
+        template is rendered once. The restored root is synced to a new
+        widget (if global sync is on) at the end. Element classes are looked
+        up in SNAPSHOT_TYPES, so subclasses must be passed to
+        register_element first.
+        """
+        nodes = snapshots.load(buf)
+        syncing = global_sync.get()
+        if syncing:
+            global_sync.toggle()
+        try:
+            elements = []
+            for node in nodes:
+                klass = import_element(node.cls)
+                if node.parent < 0:
+                    element = klass()
+                else:
+                    parent = elements[node.parent]
+                    element = klass(parent=parent)
+                    parent.children.append(element, node.key)
+                values = node.values
+                applied = values.pop('_applied_matrix', None)
+                element._restore(values)
+                if isinstance(element, DisplayMixin):
+                    if applied is not None:
+                        element._applied_matrix = transform_matrix('matrix', applied)
+                    element._compose_transform()
+                if isinstance(element, Path):
+                    element._restore_geometry(node.ops, node.coords)
+                elements.append(element)
+        finally:
+            if syncing:
+                global_sync.toggle()
+        root = elements[0]
+        if syncing and isinstance(root, SVG):
+            root._widget = SVGWidget(root)
+        return root
+
+    def save(self, filename):
+        """Write self to filename as a standalone svg document
+
+        Notes
+        -----
+        As with _repr_svg_, unchanged elements are taken from
+        self.render_cache when one is set.
+        """
+        svg = self._repr_svg_()
+        if 'xmlns=' not in svg.split('>', 1)[0]:
+            svg = svg.replace('<svg', '<svg xmlns="http://www.w3.org/2000/svg"', 1)
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write(svg)
 
     def display(self):
         display(self._widget)
 
+    def queue_mutations(self, enabled=True, loop=None):
+        """Queue changes made to the tree from other threads until a flush
+
+        Parameters
+        ----------
+        enabled : bool
+            start (True) or stop (False) queueing. Stopping flushes first.
+        loop : event loop or None
+            a flush is scheduled on this loop whenever changes are queued.
+            Defaults to the calling thread's asyncio event loop if there is
+            one; without a loop, call self.flush() periodically.
+
+        Notes
+        -----
+        The calling thread becomes the owner of the tree. Trait assignments
+        and mutating methods (append, remove, join, path builders, ...)
+        called on elements of the tree from any other thread are queued,
+        then applied in order by the owner in self.flush, which renders and
+        updates the widget once. Values read from other threads may lag
+        behind the changes they've queued.
+        """
+        queue = self._mutation_queue
+        if enabled and queue is None:
+            if loop is None and asyncio is not None:
+                try:
+                    loop = asyncio.get_event_loop()
+                except RuntimeError:
+                    loop = None
+            self._mutation_queue = MutationQueue(self.flush, loop)
+            MutationQueue.active += 1
+        elif not enabled and queue is not None:
+            if not queue.is_owner():
+                raise RuntimeError('only the owner thread can stop queueing')
+            self.flush()
+            self._mutation_queue = None
+            MutationQueue.active -= 1
+
+    def flush(self):
+        """Apply the changes queued from other threads with one widget update
+
+        Notes
+        -----
+        Changes queued while flushing are left for the next flush. If any
+        change raises an error the others are still applied and the first
+        error is raised at the end.
+        """
+        queue = self._mutation_queue
+        if queue is None:
+            return
+        if not queue.is_owner():
+            raise RuntimeError('flush must be called from the owner thread')
+        error = None
+        with self.hold_sync():
+            for function, args, kwargs in queue.drain():
+                try:
+                    function(*args, **kwargs)
+                except Exception as e:
+                    if error is None:
+                        error = e
+        if error is not None:
+            raise error
+
+    def animate(self, frame_fn, fps=30, frames=None, ack_timeout=1.0, loop=None):
+        """Call frame_fn once per frame from the asyncio event loop
+
+        Parameters
+        ----------
+        frame_fn : callable
+            called as frame_fn(frame) with the frame number. Its changes are
+            sent to the widget in one update. Returning False ends the
+            animation.
+        fps : float
+            the maximum number of frames per second
+        frames : int or None
+            the number of frames to run (forever if None)
+        ack_timeout : float
+            the longest time to wait for a view to report rendering a frame
+
+        Returns
+        -------
+        A future resolved with the number of frames run. It can be awaited,
+        and cancelling it stops the animation.
+
+        Notes
+        -----
+        Frames run on the kernel's event loop, so they never race with code
+        in other cells. The next frame is scheduled only once a view has
+        rendered the last one (or ack_timeout passes), so a slow frontend
+        lowers the frame rate rather than building up a backlog.
+        """
+        return Animation(self, frame_fn, fps, frames, ack_timeout, loop).future
+
+def deflate(svg):
+    """Returns markup compressed with zlib, reusing the last result
+
+    Notes
+    -----
+    Every view of a document is sent the same markup (see SVG.views),
+    so it's only compressed once.
+    """
+    if _deflated[0] is not svg:
+        _deflated[:] = [svg, zlib.compress(svg.encode('utf-8'), 6)]
+    return _deflated[1]
+
+_deflated = [None, None]
+
 class SVGWidget(widgets.DOMWidget):
     _view_module = Unicode('nbextensions/nbsvg/js/SVGView',sync=True)
     _view_name = Unicode('SVGView', sync=True)
     element = Instance(BaseElement)
     svg = Unicode(sync=True)
+    # markup at least this long is sent deflated (0 never compresses)
+    compress_threshold = Int(32768)
+    # pan by dragging and zoom with the wheel in the browser (see SVG.viewBox)
+    navigable = Bool(False, sync=True)
 
     def __init__(self, element, *args, **kwargs):
         super(SVGWidget,self).__init__(*args, **kwargs)
+        self._render_waiters = []
+        self._payload = None
+        self.on_msg(self._handle_msg)
         self.element = element
+        if isinstance(element, SVG):
+            element.attach(self)
         self.notify()
 
+    def _handle_msg(self, widget, content, buffers=None):
+        """Resolve the futures from self.rendered when a view reports in"""
+        event = content.get('event')
+        if event == 'ready' and self._payload is not None:
+            # a view shown after markup was sent deflated
+            self.send({'event': 'svg', 'encoding': 'deflate'}, buffers=[self._payload])
+        elif event == 'inflate-unsupported':
+            self.compress_threshold = 0
+            self._payload = None
+            self.send_state('svg')
+        elif event == 'viewBox' and isinstance(self.element, SVG):
+            self.element._navigated(self, content.get('value'))
+        elif event == 'rendered':
+            waiters, self._render_waiters = self._render_waiters, []
+            for future in waiters:
+                if not future.done():
+                    future.set_result(None)
+
+    def rendered(self, loop=None):
+        """Returns a future resolved when a view next renders self.svg"""
+        future = asyncio.Future(loop=loop)
+        self._render_waiters.append(future)
+        # futures resolved or cancelled elsewhere (e.g. by an ack_timeout)
+        future.add_done_callback(self._discard_waiter)
+        return future
+
+    def _discard_waiter(self, future):
+        try:
+            self._render_waiters.remove(future)
+        except ValueError:
+            pass
+
     def notify(self):
-        svg = self.element._repr_svg_()
-        self.svg = svg
+        self.update(self.element._repr_svg_())
+
+    def update(self, svg):
+        """Show markup rendered by the element (see SVG.views)
+
+        Notes
+        -----
+        Markup of at least compress_threshold characters is deflated and
+        sent to views as a binary buffer in a custom message, rather than
+        synced as the `svg` trait. The trait is still set, without
+        notifying, so it always holds the markup shown. Views which can't
+        inflate the payload turn compression off.
+        """
+        threshold = self.compress_threshold
+        if threshold and len(svg) >= threshold:
+            self._payload = deflate(svg)
+            self._trait_values['svg'] = svg
+            self.send({'event': 'svg', 'encoding': 'deflate'}, buffers=[self._payload])
+        else:
+            self._payload = None
+            self.svg = svg
+
+    def adopt(self, svg):
+        """Take on markup a view already shows, without sending it"""
+        self._trait_values['svg'] = svg
+        if self._payload is not None:
+            self._payload = deflate(svg)
+
+    def close(self):
+        if isinstance(self.element, SVG):
+            self.element.detach(self)
+        super(SVGWidget,self).close()
 
 class DisplayMixin(HasTraits):
 
@@ -816,35 +2950,95 @@ class DisplayMixin(HasTraits):
     _skewX = Tuple(trans=True, display=True)
     _skewY = Tuple(trans=True, display=True)
     _matrix = Tuple(trans=True, display=True)
+    # the matrix of the transform functions above
+    _own_matrix = None
+    # the matrix of transforms applied on top of those functions
+    _applied_matrix = None
+    # the matrix of the full transform (None for no transform)
+    _transform_matrix = None
 
     def __init__(self, *args, **kwargs):
         self.sync = kwargs.pop('sync',True)
         super(DisplayMixin,self).__init__(*args,**kwargs)
-        self.on_trait_change(self._render_transform, self.trait_names(trans=True))
 
     def _notify_trait(self, name, old, new):
         super(DisplayMixin,self)._notify_trait(name, old, new)
         if global_sync.get() and self.sync:
             self._notify_widget()
+        else:
+            # recordings take frames whether or not widgets are synced
+            root = self.root
+            if isinstance(root, SVG) and root._recorders:
+                root._record_frame()
 
     def _notify_widget(self):
-        self.parent._notify_widget()
+        # detached elements (e.g. built off the owner thread) have no view
+        if self.parent is not None:
+            self.parent._notify_widget()
 
+    @handles(trans=True)
     def _render_transform(self):
-        full = ''
-        rendered = []
-        for name in self.trait_names(trans=True):
-            args = getattr(self, name)
-            if args not in (tuple(),None):
-                string = str(args)
-                if string[-2] is ',':
-                    string = string[:-2]+')'
-                rendered.append('"'+name[1:]+string+'"')
-        funcs = ' '.join(rendered)
-        if funcs is str():
+        """Compose the transform functions and render them as one matrix
+
+        Notes
+        -----
+        Functions are applied in the order translate, rotate, scale, skewX,
+        skewY and then matrix, beneath any transforms from apply_transform.
+        """
+        matrix = self._compose_transform()
+        if matrix is None:
             setattr(self, 'transform', '""')
         else:
-            setattr(self, 'transform', funcs)
+            setattr(self, 'transform', render_matrices(matrix)[0])
+
+    def _compose_transform(self):
+        """Set self._own_matrix and self._transform_matrix, returning the latter"""
+        own = None
+        for name in TRANSFORM_ORDER:
+            args = getattr(self, '_'+name)
+            if args not in (tuple(),None):
+                m = transform_matrix(name, args)
+                own = m if own is None else own.dot(m)
+        self._own_matrix = own
+        applied = self._applied_matrix
+        if applied is None:
+            matrix = own
+        else:
+            matrix = applied if own is None else applied.dot(own)
+        self._transform_matrix = matrix
+        return matrix
+
+    @queued
+    def _write_transform(self, applied, total, rendered):
+        """Store a transform computed for a whole Collection
+
+        Notes
+        -----
+        Like Line._set_coords this writes straight to self._trait_values,
+        so the caller is responsible for notifying the widget.
+        """
+        self._applied_matrix = applied
+        self._transform_matrix = total
+        self._trait_values['transform'] = rendered
+        self._spatial_changed(self)
+        self._fingerprint_changed(own=True)
+        self._watch_changed()
+
+    @queued
+    def apply_transform(self, *functions):
+        """Apply transforms on top of the current one (see `compose_transforms`)"""
+        m = compose_transforms(functions)
+        applied = self._applied_matrix
+        self._applied_matrix = m if applied is None else m.dot(applied)
+        self._render_transform()
+
+    @queued
+    def reset_transform(self):
+        """Remove all transforms, including those from apply_transform"""
+        self._applied_matrix = None
+        for name in TRANSFORM_ORDER:
+            setattr(self, '_'+name, tuple())
+        self._render_transform()
 
 
     def transformation(self, **kwargs):
@@ -958,15 +3152,36 @@ class DisplayMixin(HasTraits):
                             " give)".format(len(args)))
         setattr(self, '_matrix', args)
 
+class SimplifyMixin(HasTraits):
+
+    # opt-in simplification of vertices at render time
+    simplify = Enum(('douglas_peucker', 'minmax'), None, allow_none=True)
+    # the tolerance (or minmax strip width) in pixels of the root SVG
+    tolerance = Float(1.0)
+
+    def _simplify_tolerance(self):
+        """Returns self.tolerance converted from pixels to user units
+
+        Notes
+        -----
+        The conversion accounts for the root's viewBox and the scaling of
+        any transforms applied to self or its parents.
+        """
+        scale = 1.0
+        root = self.root
+        if isinstance(root, SVG):
+            scale = root.pixel_scale() or 1.0
+        matrix = self.ctm()
+        if matrix is not None:
+            scale *= np.sqrt(abs(np.linalg.det(matrix[:2,:2]))) or 1.0
+        return self.tolerance/scale
+
 class Group(DisplayMixin,Element):
 
     tag = Unicode('g')
-    templ_form = Template('<$tag $attrs {transform}>\n{children}\n</$tag>')
-    
-    def __init__(self,*args,**kwargs):
-        super(Group,self).__init__(*args,**kwargs)
-        self.on_trait_change(self._group_set,self.trait_names(display=True))
+    templ_form = Template('<$tag $attrs>\n{children}\n</$tag>')
 
+    @handles(display=True)
     def _group_set(self, name, old, new):
         """Reconstruct the group's default template after a trait change.
         
@@ -1001,30 +3216,116 @@ class Text(VoidElement, DisplayMixin):
     string = Data(Unicode(), attr=True)
     x = Data(Length(3), attr=True)
     y = Data(Length(15), attr=True)
-    
-    def __init__(self,*args,**kwargs):
-        super(Text,self).__init__(*args,**kwargs)
-        self.fill = 'black'
-        self.stroke = 'none'
-        self.stroke_width = 0
+    # set as defaults, so making text doesn't notify for each
+    fill = Data(Unicode('black'), attr=True, display=True)
+    stroke = Data(Unicode('none'), attr=True, display=True)
+    stroke_width = Data(Length('0'), attr=True, display=True)
+
+    # approximate glyph metrics used for bounding boxes
+    _font_size = 16.0
+    _char_width = 0.6
+
+    def _local_bbox(self):
+        """Estimate the extent of self.string from the default font metrics"""
+        x, y = length_to_float(self.x), length_to_float(self.y)
+        if None in (x, y):
+            return None
+        size = self._font_size
+        width = len(self.string)*size*self._char_width
+        return (x, y-size, x+width, y+size/4)
+
+    def _render_attributes(self):
+        attrs = super(Text,self)._render_attributes()
+        attrs['#text'] = self.string
+        return attrs
         
-    def handle_value(self,name):
-        """Given a trait name return a value or formated string.
-        
-        Notes
-        -----
-        The output from self.handle_value directly substitutes place holders
-        generated in self._template_default when rendering the final template.
-        """
-        value = getattr(self,name)
+    @classmethod
+    def _format_value(cls, name, value):
         if value is None:
             return ""
+        elif name == 'string':
+            return escape(value, {'"': '&quot;'})
         else:
             return value
 
+class Labels(VoidElement, DisplayMixin):
+    """Many text labels rendered as one group of text elements
+
+    Notes
+    -----
+    x, y and strings are columns with an entry for each label, where a
+    single entry is used for every label, and labels missing an entry in
+    any column aren't rendered. The strings are escaped and the labels
+    rendered in one vectorized pass, and setting a column is a single
+    change to the tree (see declare to set several). Display traits apply
+    to the whole group.
+    """
+
+    tag = Unicode('g')
+    templ_form = Template('<$tag $attrs>{strings}</$tag>')
+    strings = Data(Column())
+    x = Data(Column((3,)))
+    y = Data(Column((15,)))
+    fill = Data(Unicode('black'), attr=True, display=True)
+    stroke = Data(Unicode('none'), attr=True, display=True)
+    stroke_width = Data(Length('0'), attr=True, display=True)
+
+    _font_size = Text._font_size
+    _char_width = Text._char_width
+
+    def declare(self, **new_traits):
+        """Reassigns new trait values to self, updating the widget once"""
+        root = self.root
+        with root.hold_sync() if isinstance(root, SVG) else _null_context():
+            super(Labels,self).declare(**new_traits)
+
+    # the `strings` placeholder holds the text elements of the labels
+    _context_fields = ('strings',)
+
+    def count(self):
+        """Returns the number of labels rendered"""
+        return label_count(self.strings, self.x, self.y)
+
+    def _raw_value(self, name):
+        if name == 'strings':
+            return (self.strings, self.x, self.y)
+        return getattr(self, name)
+
+    @classmethod
+    def _format_value(cls, name, value):
+        if name == 'strings':
+            return render_labels(*value)
+        return value
+
+    def _render_labels(self):
+        return render_labels(self.strings, self.x, self.y)
+
+    def _watch_trait(self, name, old, new):
+        # labels are content, which recordings only follow in keyframes
+        if name in ('strings', 'x', 'y'):
+            self._watch_changed(structural=True)
+        else:
+            super(Labels,self)._watch_trait(name, old, new)
+
+    def _local_bbox(self):
+        """Estimate the extent of the labels from the default font metrics"""
+        n = self.count()
+        if n == 0:
+            return None
+        x = lengths_to_floats(self.x)[:n]
+        y = lengths_to_floats(self.y)[:n]
+        if np.isnan(x).any() or np.isnan(y).any():
+            return None
+        size = self._font_size
+        strings = np.asarray(self.strings, dtype='U')
+        widths = np.char.str_len(strings if len(strings) == 1 else strings[:n])
+        widths = widths*size*self._char_width
+        return (float(x.min()), float((y-size).min()),
+                float((x+widths).max()), float((y+size/4).max()))
+
 class Shape(DisplayMixin,VoidElement):
 
-    templ_form = Template('<$tag $attrs {transform}/>')
+    templ_form = Template('<$tag $attrs/>')
 
     def __init__(self,*args,**kwargs):
         super(Shape,self).__init__(*args,**kwargs)
@@ -1032,12 +3333,37 @@ class Shape(DisplayMixin,VoidElement):
         self.stroke = 'gray'
         self.stroke_width = 1
 
+    def _stroke_pad(self):
+        """Returns half the stroke width (how far a stroke extends past an edge)"""
+        width = length_to_float(self.stroke_width)
+        return (width or 0.0)/2
+
+    def _points_bbox(self, points):
+        """Returns the bounding box of a list of (x, y) points plus stroke"""
+        try:
+            points = np.asarray(points, dtype=float).reshape(-1, 2)
+        except (TypeError, ValueError):
+            return None
+        if len(points) == 0:
+            return None
+        pad = self._stroke_pad()
+        x0, y0 = points.min(axis=0) - pad
+        x1, y1 = points.max(axis=0) + pad
+        return (x0, y0, x1, y1)
+
 class Circle(Shape):
     tag = Unicode('circle')
     cx = Data(Length(12), attr=True)
     cy = Data(Length(12), attr=True)
     r = Data(Length(10), attr=True)
 
+    def _local_bbox(self):
+        cx, cy, r = [length_to_float(v) for v in (self.cx, self.cy, self.r)]
+        if None in (cx, cy, r):
+            return None
+        r += self._stroke_pad()
+        return (cx-r, cy-r, cx+r, cy+r)
+
 class Ellipse(Shape):
 
     tag = Unicode('ellipse')
@@ -1046,23 +3372,42 @@ class Ellipse(Shape):
     rx = Data(Length(10), attr=True)
     ry = Data(Length(5), attr=True)
 
-class Polyline(Shape):
+    def _local_bbox(self):
+        values = (self.cx, self.cy, self.rx, self.ry)
+        cx, cy, rx, ry = [length_to_float(v) for v in values]
+        if None in (cx, cy, rx, ry):
+            return None
+        pad = self._stroke_pad()
+        return (cx-rx-pad, cy-ry-pad, cx+rx+pad, cy+ry+pad)
+
+class Polyline(SimplifyMixin,Shape):
 
     tag = Unicode('polyline')
     points = Data(List(None,[(2,2),(12,12)]), attr=True)
 
-    def handle_value(self,name):
-        """Given a trait name return a value or formated string.
-        
-        Notes
-        -----
-        The output from self.handle_value directly substitutes place holders
-        generated in self._template_default when rendering the final template.
-        """
+    _context_fields = ('points',)
+
+    def _raw_value(self, name):
+        if name=='points':
+            if self.simplify is not None:
+                return (self.points, self.simplify, self._simplify_tolerance())
+            return (self.points, None, None)
+        return getattr(self,name)
+
+    @classmethod
+    def _format_value(cls, name, value):
         if name=='points':
-            return '\n'.join([unicode(p)[1:-1] for p in self.points])
+            points, method, tolerance = value
+            if method is not None:
+                points = simplify_points(points, method, tolerance)
+                return '\n'.join(['{0},{1}'.format(format_number(x),
+                    format_number(y)) for x, y in points])
+            return '\n'.join([unicode(p)[1:-1] for p in points])
         else:
-            return getattr(self,name)
+            return value
+
+    def _local_bbox(self):
+        return self._points_bbox(self.points)
 
 class Polygon(Polyline):
 
@@ -1080,10 +3425,9 @@ class Line(Shape):
 
     def __init__(self,*args,**kwargs):
         super(Line,self).__init__(*args,**kwargs)
-        self.on_trait_change(self._set_points,self.trait_names(coords=True))
-        self.on_trait_change(self._set_coords,'points')
         self._set_points()
 
+    @handles(coords=True)
     def _set_points(self):
         """Adjust the points trait to match x1, y1, x2, and y2 when they've changed."""
         point_list = [[0,0],[0,0]]
@@ -1095,7 +3439,9 @@ class Line(Shape):
                 j=1
             point_list[i][j] = getattr(self,name)
         self._trait_values['points'] = [tuple(t) for t in point_list]
+        clear_data_cache(self, 'points')
     
+    @handles('points')
     def _set_coords(self,name,old,new):
         """Adjust the traits x1, y1, x2, and y2 to match points when it's changed."""
         point_list = [[0,0],[0,0]]
@@ -1108,16 +3454,31 @@ class Line(Shape):
             self._trait_values[name] = self.points[i][j]
             point_list[i][j] = self._trait_values[name]
         self._trait_values['points'] = [tuple(t) for t in point_list]
+        clear_data_cache(self, 'points', *self.trait_names(coords=True))
+
+    def _local_bbox(self):
+        values = (self.x1, self.y1, self.x2, self.y2)
+        coords = [length_to_float(v) for v in values]
+        if None in coords:
+            return None
+        return self._points_bbox(coords)
 
-class Path(Shape):
+class Path(SimplifyMixin,Shape):
 
     tag = Unicode('path')
-    segments = List()
+    segments = List(fingerprint=False)
     d = Data(Unicode(), attr=True)
+    # store geometry in a PathBuffer instead of PathSegment objects
+    packed = Bool(False)
+    _buffer = None
 
     def __add__(self, other):
         if isinstance(other, Path):
-            self.extend(other.segments)
+            if self._buffer is not None and other._buffer is not None:
+                self._buffer.extend(other._buffer)
+                self._render_path()
+            else:
+                self.extend(other.materialize())
         elif isinstance(other, PathSegment):
             self.append(other)
         else:
@@ -1125,58 +3486,224 @@ class Path(Shape):
                             "'PathSegment' or 'Path' objects.".format(self))
         return self
 
+    def _packed_changed(self, name, value):
+        """Move the geometry between self.segments and a PathBuffer"""
+        if value and self._buffer is None:
+            segments = self.segments
+            self.segments = []
+            self._repack(segments)
+        elif not value and self._buffer is not None:
+            segments = self.materialize()
+            self._buffer = None
+            self.segments = segments
+            self._render_path()
+
     def _render_path(self):
-        segments = self.segments
-        paths = [seg._render_path() for seg in segments]
-        d = ' '.join(paths)
+        if self._buffer is not None:
+            d = self._buffer.render()
+        else:
+            segments = self.segments
+            paths = [seg._render_path() for seg in segments]
+            d = ' '.join(paths)
         setattr(self, 'd', d)
 
-    def append(self, obj):
-        self.segments.append(obj)
+    def _repack(self, segments):
+        """Replace the buffer of a packed path with the given segments"""
+        self._buffer = PathBuffer()
+        for seg in segments:
+            self._buffer.push(seg._command, seg.coords())
+            if seg.close:
+                self._buffer.push('Z')
         self._render_path()
 
+    def _packed_buffer(self):
+        """Returns the geometry of self as a PathBuffer
+
+        Notes
+        -----
+        For unpacked paths a new buffer is encoded from self.segments.
+        """
+        if self._buffer is not None:
+            return self._buffer
+        buf = PathBuffer()
+        for seg in self.segments:
+            buf.push(seg._command, seg.coords())
+            if seg.close:
+                buf.push('Z')
+        return buf
+
+    def _restore_geometry(self, ops, coords):
+        """Set the geometry of self from PathBuffer arrays, leaving self.d as is"""
+        buf = PathBuffer()
+        buf.ops.extend(np.asarray(ops).tolist())
+        buf.coords.extend(np.asarray(coords).tolist())
+        if len(buf):
+            buf._last = chr(buf.ops[-1])
+        self._buffer = buf
+        if not self.packed:
+            segments = self.materialize()
+            self._buffer = None
+            self._trait_values['segments'] = segments
+
+    def materialize(self):
+        """Returns a list of PathSegment objects describing self
+
+        Notes
+        -----
+        For packed paths new segments are created from the buffer on each
+        call, so modifying them doesn't affect self.
+        """
+        if self._buffer is None:
+            return list(self.segments)
+        segments = []
+        for command, coords in self._buffer.commands():
+            seg = PATH_SEGMENTS[command.upper()](*coords)
+            if command.islower():
+                seg.rel()
+            segments.append(seg)
+        return segments
+
+    # when self.simplify is set, runs of line segments in `d` are
+    # simplified against the current size of the root SVG
+    _context_fields = ('d',)
+
+    def _raw_value(self, name):
+        if name=='d' and self.simplify is not None:
+            return (self._packed_buffer(), self.simplify, self._simplify_tolerance())
+        return getattr(self,name)
+
+    @classmethod
+    def _format_value(cls, name, value):
+        if name=='d' and isinstance(value, tuple):
+            return simplify_path(*value)
+        return value
+
+    def _local_bbox(self):
+        return self._points_bbox(path_points(self._packed_buffer()))
+
+    @queued
+    def append(self, obj):
+        if self._buffer is not None:
+            fragment = self._buffer.push(obj._command, obj.coords())
+            if obj.close:
+                fragment += self._buffer.push('Z')
+            setattr(self, 'd', (self.d + fragment).strip())
+        else:
+            self.segments.append(obj)
+            self._render_path()
+
+    @queued
     def insert(self, index, obj):
-        self.segments.insert(index,obj)
-        self._render_path()
+        if self._buffer is not None:
+            segments = self.materialize()
+            segments.insert(index, obj)
+            self._repack(segments)
+        else:
+            self.segments.insert(index,obj)
+            self._render_path()
 
     def extend(self, objects):
         for o in objects:
             self.append(o)
 
+    @queued
     def pop(self, index):
+        if self._buffer is not None:
+            segments = self.materialize()
+            obj = segments.pop(index)
+            self._repack(segments)
+            return obj
         obj = self.segments.pop(index)
         self._render_path()
         return obj
 
-    def M(self, coords=tuple(), *args, **kwargs):
-        mt = MoveTo(coords, *args, **kwargs)
-        self.append(mt)
-        return self
+    def _add_segment(self, command, args, kwargs):
+        """Add a segment given its command letter (lower case for relative)
 
-    def m(self, coords=tuple(), *args, **kwargs):
-        rmt = MoveTo(coords, *args, **kwargs).rel()
-        self.append(rmt)
+        Notes
+        -----
+        Returns self, so calls can be chained even when the segment is
+        queued for another thread (see _push_segment).
+        """
+        self._push_segment(command, args, kwargs)
         return self
 
-    def A(self, coords=tuple(), *args, **kwargs):
-        ea = EllipticalArc(coords, *args, **kwargs)
-        self.append(ea)
-        return self
+    @queued
+    def _push_segment(self, command, args, kwargs):
+        """Add a segment to self.segments or the buffer of a packed path
 
-    def a(self, coords=tuple(), *args, **kwargs):
-        rea = EllipticalArc(coords, *args, **kwargs).rel()
-        self.append(rea)
-        return self
+        Notes
+        -----
+        Packed paths push the coordinates straight into the buffer, unless
+        coordinates are given by name.
+        """
+        if self._buffer is not None and not kwargs:
+            setattr(self, 'd', (self.d + self._buffer.push(command, args)).strip())
+        else:
+            seg = PATH_SEGMENTS[command.upper()](*args, **kwargs)
+            if command.islower():
+                seg.rel()
+            self.append(seg)
 
-    def L(self, points=None, *args, **kwargs):
-        l = LineTo(points,*args, **kwargs)
-        self.append(l)
-        return self
+    def M(self, *args, **kwargs):
+        return self._add_segment('M', args, kwargs)
 
-    def l(self, points=None, *args, **kwargs):
-        rl = LineTo(points,*args, **kwargs).rel()
-        self.append(rl)
-        return self
+    def m(self, *args, **kwargs):
+        return self._add_segment('m', args, kwargs)
+
+    def A(self, *args, **kwargs):
+        return self._add_segment('A', args, kwargs)
+
+    def a(self, *args, **kwargs):
+        return self._add_segment('a', args, kwargs)
+
+    def L(self, *args, **kwargs):
+        return self._add_segment('L', args, kwargs)
+
+    def l(self, *args, **kwargs):
+        return self._add_segment('l', args, kwargs)
+
+    def H(self, *args, **kwargs):
+        return self._add_segment('H', args, kwargs)
+
+    def h(self, *args, **kwargs):
+        return self._add_segment('h', args, kwargs)
+
+    def V(self, *args, **kwargs):
+        return self._add_segment('V', args, kwargs)
+
+    def v(self, *args, **kwargs):
+        return self._add_segment('v', args, kwargs)
+
+    def C(self, *args, **kwargs):
+        return self._add_segment('C', args, kwargs)
+
+    def c(self, *args, **kwargs):
+        return self._add_segment('c', args, kwargs)
+
+    def S(self, *args, **kwargs):
+        return self._add_segment('S', args, kwargs)
+
+    def s(self, *args, **kwargs):
+        return self._add_segment('s', args, kwargs)
+
+    def Q(self, *args, **kwargs):
+        return self._add_segment('Q', args, kwargs)
+
+    def q(self, *args, **kwargs):
+        return self._add_segment('q', args, kwargs)
+
+    def T(self, *args, **kwargs):
+        return self._add_segment('T', args, kwargs)
+
+    def t(self, *args, **kwargs):
+        return self._add_segment('t', args, kwargs)
+
+    def Z(self):
+        return self._add_segment('Z', (), {})
+
+    def z(self):
+        return self._add_segment('z', (), {})
 
 class PathSegment(HasTraits):
 
@@ -1209,8 +3736,7 @@ class PathSegment(HasTraits):
 
     def __add__(self, other):
         if isinstance(other,Path):
-            other.segments.insert(0,self)
-            other._render_path()
+            other.insert(0,self)
         else:
             klass = self.__class__.__name__
             raise TypeError("Addition for '{0}' object must"
@@ -1306,4 +3832,182 @@ class LineTo(PathSegment):
 
     def coords(self):
         """Returns a copy of the raw coordinates data"""
-        return self._coords[:]
\ No newline at end of file
+        return self._coords[:]
+
+class HorizontalLineTo(PathSegment):
+
+    _command = Unicode('H')
+    x = Data(Float(0), coord=0)
+
+class VerticalLineTo(PathSegment):
+
+    _command = Unicode('V')
+    y = Data(Float(0), coord=0)
+
+class CurveTo(PathSegment):
+
+    _command = Unicode('C')
+    x1 = Data(Float(0), coord=0)
+    y1 = Data(Float(0), coord=1)
+    x2 = Data(Float(0), coord=2)
+    y2 = Data(Float(0), coord=3)
+    x = Data(Float(0), coord=4)
+    y = Data(Float(0), coord=5)
+
+class SmoothCurveTo(PathSegment):
+
+    _command = Unicode('S')
+    x2 = Data(Float(0), coord=0)
+    y2 = Data(Float(0), coord=1)
+    x = Data(Float(0), coord=2)
+    y = Data(Float(0), coord=3)
+
+class QuadraticCurveTo(PathSegment):
+
+    _command = Unicode('Q')
+    x1 = Data(Float(0), coord=0)
+    y1 = Data(Float(0), coord=1)
+    x = Data(Float(0), coord=2)
+    y = Data(Float(0), coord=3)
+
+class SmoothQuadraticCurveTo(PathSegment):
+
+    _command = Unicode('T')
+    x = Data(Float(0), coord=0)
+    y = Data(Float(0), coord=1)
+
+class ClosePath(PathSegment):
+
+    _command = Unicode('Z')
+
+#-----------------------------------------------------------------------------
+# Declarative Specs
+#-----------------------------------------------------------------------------
+
+def from_spec(spec, chunk_size=2**16):
+    """Build an element tree from a declarative spec
+
+    Parameters
+    ----------
+    spec : dict, str, or file-like
+        the root element spec, as a dict, a JSON string, or a file-like
+        object of JSON which is read incrementally
+    chunk_size : int
+        the amount read from a file-like spec at once
+
+    Notes
+    -----
+    Each spec is an object of trait names and values, with a `type` naming
+    the element ('svg', 'group', 'circle', 'path', ...) and a list of child
+    specs under `children`. The type defaults to 'group', or 'svg' for the
+    root, and is needed before the children when streaming. Transform
+    functions are given by name (e.g. "rotate": [30, 5, 5]) and paths by
+    their `d` string. Elements are built with widget sync turned off and
+    their values validated and stored directly, so each template is built
+    once, and a widget for the root (if it's an SVG) is synced at the end.
+
+    Returns
+    -------
+    The root element.
+    """
+    builder = SpecBuilder()
+    syncing = global_sync.get()
+    if syncing:
+        global_sync.toggle()
+    try:
+        if isinstance(spec, dict):
+            root = walk_spec(spec, builder.open, builder.close)
+        else:
+            if isinstance(spec, bytes):
+                spec = spec.decode('utf-8')
+            if isinstance(spec, unicode):
+                spec = io.StringIO(spec)
+            root = SpecReader(spec, chunk_size).read(builder.open, builder.close)
+    finally:
+        if syncing:
+            global_sync.toggle()
+    if syncing and isinstance(root, SVG):
+        root._widget = SVGWidget(root)
+    return root
+
+class SpecBuilder(object):
+    """Creates elements for from_spec (see SpecReader.read)"""
+
+    def open(self, attrs, parent):
+        attrs = dict(attrs)
+        kind = attrs.pop('type', 'svg' if parent is None else 'group')
+        klass = SPEC_TYPES.get(kind.lower())
+        if klass is None:
+            raise SpecError('unknown element type {0!r}'.format(kind))
+        if parent is None:
+            element = klass()
+        else:
+            element = klass(parent=parent)
+        self.apply(element, attrs)
+        if parent is not None:
+            parent.children.append(element)
+        return element
+
+    def close(self, element, attrs):
+        attrs = dict(attrs)
+        kind = attrs.pop('type', None)
+        if kind is not None and SPEC_TYPES.get(kind.lower()) is not type(element):
+            raise SpecError("the type of an element with children must come"
+                            " before them (or be 'group')")
+        self.apply(element, attrs)
+        if isinstance(element, Path) and element.d:
+            buf = parse_path_data(element.d)
+            element._restore_geometry(buf.ops, buf.coords)
+            element._trait_values['d'] = buf.render()
+            clear_data_cache(element, 'd')
+        elif isinstance(element, Line):
+            element._set_points()
+        if isinstance(element, DisplayMixin):
+            matrix = element._compose_transform()
+            if matrix is not None:
+                element._trait_values['transform'] = render_matrices(matrix)[0]
+        element.update_template()
+
+    def apply(self, element, attrs):
+        """Validate attrs and write them straight to element._trait_values"""
+        cls = type(element)
+        traits = cls.__dict__.get('_spec_traits')
+        if traits is None:
+            traits = cls._spec_traits = cls.class_traits()
+        for name, value in attrs.items():
+            if name in TRANSFORM_ORDER:
+                name = '_' + name
+                value = tuple(value) if isinstance(value, (list, tuple)) else (value,)
+            elif name == 'points':
+                value = [tuple(p) for p in value]
+            trait = traits.get(name)
+            if trait is None or name in SNAPSHOT_SKIP:
+                raise SpecError('{0} has no attribute {1!r}'.format(
+                    type(element).__name__, name))
+            element._trait_values[name] = trait._validate(element, value)
+            clear_data_cache(element, name)
+            if name == 'points' and isinstance(element, Line):
+                element._set_coords(name, None, None)
+
+# the order transform functions are composed in (see DisplayMixin)
+TRANSFORM_ORDER = ('translate', 'rotate', 'scale', 'skewX', 'skewY', 'matrix')
+
+# element classes by lower case name (see Element.join)
+ELEMENT_TYPES = dict((k.__name__.lower(), k) for k in (Circle, Ellipse,
+    Line, Polyline, Polygon, Text, Labels, Group, Path))
+
+# traits rebuilt by SVG.restore rather than stored in snapshots
+SNAPSHOT_SKIP = ('parent', 'children', 'data', 'klass', 'template',
+                 'segments', 'render_cache')
+
+# element classes by their type in from_spec
+SPEC_TYPES = dict(ELEMENT_TYPES, svg=SVG, g=Group)
+
+# element classes restored from snapshots, by snapshot_name
+SNAPSHOT_TYPES = dict((snapshot_name(k), k) for k in SPEC_TYPES.values())
+
+# segment classes by (upper case) path command
+PATH_SEGMENTS = {'M': MoveTo, 'L': LineTo, 'H': HorizontalLineTo,
+                 'V': VerticalLineTo, 'C': CurveTo, 'S': SmoothCurveTo,
+                 'Q': QuadraticCurveTo, 'T': SmoothQuadraticCurveTo,
+                 'A': EllipticalArc, 'Z': ClosePath}
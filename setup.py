@@ -21,5 +21,6 @@ setup(
     packages=['nbsvg', 'nbsvg/py'],
     include_package_data=True,
     install_requires=["jupyter-pip"],
+    entry_points={'console_scripts': ['nbsvg = nbsvg.py.cli:main']},
     cmdclass=cmdclass('nbsvg'),
 )
\ No newline at end of file
@@ -0,0 +1,18 @@
+# encoding: utf-8
+"""Shared Fixtures for the Tests."""
+
+from __future__ import absolute_import
+
+import pytest
+
+from nbsvg.py.svg import global_sync
+
+@pytest.fixture(autouse=True)
+def headless():
+    """Turn widget sync off, since there's no kernel to make widgets with"""
+    syncing = global_sync.get()
+    if syncing:
+        global_sync.toggle()
+    yield
+    if syncing:
+        global_sync.toggle()
@@ -0,0 +1,52 @@
+# encoding: utf-8
+"""Tests of the nbsvg command."""
+
+from __future__ import absolute_import
+
+import io
+import json
+import os
+from xml.dom import minidom
+
+import pytest
+
+from nbsvg.py.cli import main
+
+SPEC = {'type': 'svg', 'width': 50, 'height': 40, 'children': [
+    {'type': 'g', 'fill': 'red', 'rotate': [30, 5, 5], 'children': [
+        {'type': 'circle', 'cx': 1, 'cy': 2, 'r': 1},
+        {'type': 'path', 'd': 'M 0 0 L 5 5'}]},
+    {'type': 'text', 'string': u'<a> & \xe9'},
+    {'type': 'labels', 'x': [1, 2], 'y': [3, 4], 'strings': ['a', 'b']}]}
+
+def write_spec(path, spec=SPEC):
+    with io.open(str(path), 'w', encoding='utf-8') as f:
+        f.write(json.dumps(spec, ensure_ascii=False))
+    return str(path)
+
+def test_writes_well_formed_svg(tmpdir):
+    spec = write_spec(tmpdir.join('scene.json'))
+    assert main([spec]) == 0
+    document = minidom.parse(str(tmpdir.join('scene.svg')))
+    root = document.documentElement
+    assert root.tagName == 'svg'
+    assert root.getAttribute('xmlns') == 'http://www.w3.org/2000/svg'
+    assert [n.tagName for n in root.childNodes if n.nodeType == n.ELEMENT_NODE] == [
+        'g', 'text', 'g']
+    assert root.getElementsByTagName('text')[0].firstChild.data == u'<a> & \xe9'
+
+def test_output_dir_and_failures(tmpdir, capsys):
+    good = write_spec(tmpdir.join('good.json'))
+    bad = tmpdir.join('bad.json')
+    bad.write('{"type": "svg", ')
+    out = tmpdir.join('out')
+    assert main(['-o', str(out), good, str(bad)]) == 1
+    assert os.listdir(str(out)) == ['good.svg']
+    assert 'bad.json' in capsys.readouterr().err
+
+@pytest.mark.parametrize('jobs', ['-1', 'many'])
+def test_jobs_must_not_be_negative(jobs, tmpdir):
+    spec = write_spec(tmpdir.join('scene.json'))
+    with pytest.raises(SystemExit) as e:
+        main(['-j', jobs, spec])
+    assert e.value.code == 2
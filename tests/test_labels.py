@@ -0,0 +1,35 @@
+# encoding: utf-8
+"""Tests of Labels."""
+
+from __future__ import absolute_import
+
+from nbsvg.py.svg import SVG, Labels
+
+def texts(labels):
+    return labels._render_labels().split('\n')
+
+def test_columns():
+    view = SVG()
+    labels = view.Labels(x=[1, 2.5], y=[3, 4], strings=['a', '<b>'])
+    assert texts(labels) == ['<text x="1" y="3">a</text>',
+                             '<text x="2.5" y="4">&lt;b&gt;</text>']
+    assert labels.count() == 2
+
+def test_single_entries_are_repeated():
+    labels = Labels(x=[1, 2, 3], y=[5], strings=['1e3'])
+    assert texts(labels) == ['<text x="{0}" y="5">1e3</text>'.format(x) for x in (1, 2, 3)]
+    # strings are text, however many there are
+    labels.strings = ['1e3', 'x', 'y']
+    assert texts(labels)[0] == '<text x="1" y="5">1e3</text>'
+
+def test_shortest_column_wins():
+    labels = Labels(x=[1, 2, 3], y=[1, 2], strings=['a', 'b', 'c', 'd'])
+    assert labels.count() == 2
+    assert len(texts(labels)) == 2
+
+def test_empty_labels_are_truthy():
+    labels = Labels(strings=[])
+    assert labels.count() == 0
+    assert labels
+    assert labels._render_labels() == u''
+    assert labels.bbox() is None
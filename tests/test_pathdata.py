@@ -0,0 +1,59 @@
+# encoding: utf-8
+"""Tests of packed path data."""
+
+from __future__ import absolute_import
+
+import numpy as np
+import pytest
+
+from nbsvg.py.pathdata import PathBuffer, format_numbers, walk, path_points, simplify_path
+
+def path(*ops):
+    """Returns a PathBuffer with the (command, coords...) ops pushed"""
+    buf = PathBuffer()
+    for op in ops:
+        buf.push(op[0], op[1:])
+    return buf
+
+def test_format_numbers():
+    assert format_numbers([1, 2.5, -0.0, 1e-9, 1/3.0, -3]) == [
+        '1', '2.5', '0', '0', '0.333333', '-3']
+    assert format_numbers([]) == []
+
+def test_push_renders_each_op():
+    buf = PathBuffer()
+    assert buf.push('M', [1, 2, 3, 4]) == ' M 1 2 L 3 4'
+    # a repeated command is written without its letter
+    assert buf.push('L', [5, 6]) == ' 5 6'
+    assert buf.push('z') == ' z'
+    assert len(buf) == 4
+    assert buf.render() == 'M 1 2 L 3 4 5 6 z'
+
+@pytest.mark.parametrize('command, coords', [('L', [1]), ('C', [1, 2, 3]),
+                                             ('Z', [1]), ('X', [1, 2])])
+def test_push_checks_arity(command, coords):
+    with pytest.raises(ValueError):
+        PathBuffer().push(command, coords)
+
+def test_extend():
+    a = path(('M', 0, 0), ('L', 1, 1))
+    a.extend(path(('L', 2, 2), ('Z',)))
+    assert a.render() == 'M 0 0 L 1 1 2 2 Z'
+
+def test_walk_makes_points_absolute():
+    buf = path(('M', 1, 1), ('l', 2, 0), ('h', 3), ('v', 4), ('a', 1, 1, 0, 0, 1, 1, 1), ('z',))
+    ends = [end for command, coords, start, end in walk(buf)]
+    assert ends == [(1, 1), (3, 1), (6, 1), (6, 5), (7, 6), (1, 1)]
+
+def test_path_points_contain_curves():
+    buf = path(('M', 0, 0), ('Q', 5, 10, 10, 0), ('T', 20, 0))
+    points = path_points(buf)
+    assert points.min(axis=0).tolist() == [0, -10]
+    assert points.max(axis=0).tolist() == [20, 10]
+
+def test_simplify_path_keeps_other_commands():
+    line = np.repeat(np.linspace(1, 10, 10), 2)
+    buf = path(('M', 0, 0), ('L',) + tuple(line), ('C', 11, 11, 12, 12, 13, 13),
+               ('l', 1, 0, 1, 0), ('Z',))
+    assert simplify_path(buf, 'douglas_peucker', 0.1) == (
+        'M 0 0 L 10 10 C 11 11 12 12 13 13 L 15 13 Z')
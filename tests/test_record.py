@@ -0,0 +1,51 @@
+# encoding: utf-8
+"""Tests of recording and replaying changes."""
+
+from __future__ import absolute_import
+
+from xml.etree import ElementTree
+
+from nbsvg.py.svg import SVG
+from nbsvg.py.record import read_recording, replay_frames
+
+def tree(markup):
+    """Returns markup as nested tuples, since attribute order may differ"""
+    def convert(node):
+        return (node.tag, dict(node.attrib), (node.text or '').strip(),
+                [convert(child) for child in node])
+    return convert(ElementTree.fromstring(markup.encode('utf-8')))
+
+def scene():
+    view = SVG()
+    group = view.Group()
+    circle = group.Circle(cx=10, cy=10, r=5)
+    view.Text().string = u'a < b'
+    return view, group, circle
+
+def test_round_trip(tmpdir):
+    path = str(tmpdir.join('scene.jsonl'))
+    view, group, circle = scene()
+    with view.record(path) as recorder:
+        for x in (20, 30, 40):
+            circle.cx = x
+        group.fill = 'red'
+        view.Text().string = u'new'
+        circle.r = 7
+    frames = list(replay_frames(path))
+    assert recorder.frames == len(frames) == 8
+    assert tree(frames[-1][1]) == tree(view._repr_svg_())
+    # only the first frame and the one adding text are keyframes
+    assert sum('svg' in f for f in read_recording(path)) == 2
+
+def test_hold_sync_is_one_frame(tmpdir):
+    path = str(tmpdir.join('scene.jsonl'))
+    view, group, circle = scene()
+    with view.record(path) as recorder:
+        with view.hold_sync():
+            circle.cx = 20
+            circle.cy = 30
+            group.fill = 'blue'
+    assert recorder.frames == 2
+    last = list(read_recording(path))[-1]
+    assert len(last['c']) == 2
+    assert tree(list(replay_frames(path))[-1][1]) == tree(view._repr_svg_())
@@ -0,0 +1,72 @@
+# encoding: utf-8
+"""Tests of the on-disk render cache."""
+
+from __future__ import absolute_import
+
+import json
+import os
+import subprocess
+import sys
+
+from nbsvg.py.rendercache import RenderCache
+from nbsvg.py.svg import SVG
+
+# builds a scene with a render cache in the directory given, saves it and
+# prints the cache's counts and the markup
+RENDER = '''
+import json, sys
+from nbsvg.py.svg import SVG, global_sync
+from nbsvg.py.rendercache import RenderCache
+global_sync.toggle()
+cache = RenderCache(sys.argv[1])
+view = SVG(render_cache=cache)
+group = view.Group()
+for i in range(5):
+    group.Circle(cx=i, cy=i, r=1)
+view.save(sys.argv[2])
+print(json.dumps({'hits': cache.hits, 'misses': cache.misses,
+                  'entries': len(cache._entries())}))
+'''
+
+def render(directory, output):
+    out = subprocess.check_output([sys.executable, '-c', RENDER, directory, output])
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+def test_later_processes_hit(tmpdir):
+    directory = str(tmpdir.join('cache'))
+    first = render(directory, str(tmpdir.join('first.svg')))
+    assert first['hits'] == 0 and first['entries'] > 0
+    second = render(directory, str(tmpdir.join('second.svg')))
+    # the group is served whole, so its circles aren't looked up
+    assert second == {'hits': 1, 'misses': 0, 'entries': first['entries']}
+    assert tmpdir.join('first.svg').read() == tmpdir.join('second.svg').read()
+
+def test_hits_touch_entries_once_per_interval(tmpdir):
+    cache = RenderCache(str(tmpdir), touch_interval=60)
+    cache.put('a', u'<a/>')
+    path = cache._path('a')
+    os.utime(path, (1, 1))
+    assert cache.get('a') == u'<a/>'
+    # just written, so not touched again yet
+    assert os.path.getmtime(path) == 1
+    cache = RenderCache(str(tmpdir), touch_interval=60)
+    assert cache.get('a') == u'<a/>'
+    assert os.path.getmtime(path) > 1
+
+def test_eviction(tmpdir):
+    cache = RenderCache(str(tmpdir), max_bytes=100, low_water=0.5)
+    for i in range(10):
+        cache.put(str(i), u'x'*20)
+        os.utime(cache._path(str(i)), (i, i))
+    assert cache._size <= 100
+    assert '9' in cache and '0' not in cache
+    assert cache.get('0') is None and cache.misses == 1
+
+def test_changes_miss(tmpdir):
+    view = SVG(render_cache=RenderCache(str(tmpdir)))
+    group = view.Group()
+    circle = group.Circle(r=1)
+    before = view._repr_svg_()
+    circle.r = 2
+    after = view._repr_svg_()
+    assert before != after and 'r="2px"' in after
@@ -0,0 +1,83 @@
+# encoding: utf-8
+"""Tests of polyline simplification."""
+
+from __future__ import absolute_import
+
+import numpy as np
+import pytest
+
+from nbsvg.py.simplify import douglas_peucker, minmax_decimate, simplify_points
+from nbsvg.py.svg import SVG
+
+def test_douglas_peucker_drops_collinear_points():
+    points = [(x, 2*x) for x in range(10)]
+    assert douglas_peucker(points, 0.01).tolist() == [[0, 0], [9, 18]]
+
+def test_douglas_peucker_keeps_corners():
+    points = [(0, 0), (1, 0.01), (2, 0), (3, 5), (4, 0)]
+    assert douglas_peucker(points, 0.1).tolist() == [[0, 0], [2, 0], [3, 5], [4, 0]]
+
+def test_douglas_peucker_tolerance():
+    x = np.linspace(0, 2*np.pi, 1000)
+    points = np.column_stack([x, np.sin(x)])
+    kept = douglas_peucker(points, 0.01)
+    assert 3 < len(kept) < 100
+    # dropped points are within the tolerance of the simplified line, so
+    # within sqrt(2) times it vertically, since no chord is steeper than 1
+    error = np.abs(np.interp(x, kept[:,0], kept[:,1]) - points[:,1])
+    assert error.max() <= 0.01*np.sqrt(2)
+
+def test_douglas_peucker_closed_ring():
+    points = [(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]
+    assert douglas_peucker(points, 0.1).tolist() == [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]
+
+def test_minmax_keeps_the_envelope():
+    x = np.arange(1000)/100.0
+    y = np.sin(x*37)
+    kept = minmax_decimate(np.column_stack([x, y]), 1.0)
+    assert len(kept) <= 4*10
+    columns = np.floor(x)
+    for c in range(10):
+        strip = kept[np.floor(kept[:,0]) == c]
+        assert strip[:,1].min() == y[columns == c].min()
+        assert strip[:,1].max() == y[columns == c].max()
+    # the original order is kept
+    assert (np.diff(kept[:,0]) > 0).all()
+
+def test_small_inputs_are_unchanged():
+    points = [(0, 0), (1, 1)]
+    assert douglas_peucker(points, 1).tolist() == [[0, 0], [1, 1]]
+    assert minmax_decimate(points, 1).tolist() == [[0, 0], [1, 1]]
+    assert douglas_peucker([(0, 0), (1, 5), (2, 0)], 0).tolist() == [[0, 0], [1, 5], [2, 0]]
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        simplify_points([(0, 0)], 'spline', 1)
+
+def wiggle(n=200, amplitude=3):
+    return [(x, amplitude*(x % 2)) for x in range(n)]
+
+def test_polyline_tolerance_follows_the_root_scale():
+    view = SVG()
+    view.width, view.height = 100, 100
+    line = view.Polyline()
+    line.points = wiggle()
+    line.simplify = 'douglas_peucker'
+    # 3 user units are 3 pixels, so the wiggle is kept
+    assert len(line.handle_value('points').splitlines()) == 200
+    # 3 user units are 0.3 pixels, under the 1 pixel tolerance
+    view.viewBox = (0, 0, 1000, 1000)
+    assert line.handle_value('points').splitlines() == ['0,0', '199,3']
+    line.simplify = None
+    assert len(line.handle_value('points').splitlines()) == 200
+
+def test_path_tolerance_follows_transforms():
+    view = SVG()
+    view.width, view.height = 100, 100
+    group = view.Group()
+    path = group.Path()
+    path.M(0, 0).L(*[v for point in wiggle()[1:] for v in point])
+    path.simplify = 'douglas_peucker'
+    assert len(path.handle_value('d').split()) > 200
+    group.scale(0.1)
+    assert path.handle_value('d') == 'M 0 0 L 199 3'
@@ -0,0 +1,81 @@
+# encoding: utf-8
+"""Tests of SVG.snapshot and SVG.restore."""
+
+from __future__ import absolute_import
+
+import pytest
+
+from nbsvg.py.svg import SVG, Circle, Collection, register_element, SNAPSHOT_TYPES
+from nbsvg.py.snapshot import SnapshotError
+
+def scene():
+    view = SVG()
+    view.width, view.height = 300, 200
+    group = view.Group(label='points')
+    group.fill = 'red'
+    for i in range(20):
+        group.Circle().declare(cx=i*3.5, cy=i, r=2)
+    view.Ellipse().rotate(30)
+    view.Polyline().points = [(1, 2), (3, 4.5), (9, 9)]
+    view.Text().string = u'h\xe9llo <b>'
+    view.Path().M(1, 2).l(3, 4).C(1, 2, 3, 4, 5, 6).z()
+    packed = view.Path()
+    packed.packed = True
+    packed.M(0, 0).L(5, 5, 6, 6).a(3, 3, 0, 0, 1, 10, 0)
+    return view
+
+def test_round_trip():
+    view = scene()
+    restored = SVG.restore(view.snapshot())
+    assert restored._repr_svg_() == view._repr_svg_()
+    assert restored.fingerprint() == view.fingerprint()
+    assert list(restored.children.keys()) == list(view.children.keys())
+
+def test_restored_elements_are_live():
+    view = scene()
+    restored = SVG.restore(view.snapshot())
+    circle = restored.get('points').children[0]
+    circle.cx = 50
+    assert circle.cx == '50px'
+    path = restored.children[-1]
+    path.l(1, 1)
+    assert path.d == 'M 0 0 L 5 5 6 6 a 3 3 0 0 1 10 0 l 1 1'
+
+def test_applied_transforms():
+    view = SVG()
+    ellipse = view.Ellipse()
+    line = view.Line()
+    line.x2 = 10
+    Collection([ellipse, line]).transform(('translate', 5, 5))
+    restored = SVG.restore(view.snapshot())
+    assert restored._repr_svg_() == view._repr_svg_()
+    assert restored.children[1].bbox() == line.bbox()
+
+class Dot(Circle):
+    pass
+
+def test_unregistered_class():
+    view = SVG()
+    view.children.append(Dot())
+    with pytest.raises(SnapshotError):
+        view.snapshot()
+    register_element(Dot)
+    try:
+        restored = SVG.restore(view.snapshot())
+        assert type(restored.children[0]) is Dot
+    finally:
+        SNAPSHOT_TYPES.pop('{0}.Dot'.format(__name__))
+
+def test_unknown_class_is_not_imported():
+    view = SVG()
+    view.Circle()
+    buf = view.snapshot()
+    name = b'nbsvg.py.svg.Circle'
+    forged = b'os.path.abspath____'
+    assert len(forged) == len(name)
+    with pytest.raises(SnapshotError):
+        SVG.restore(buf.replace(name, forged))
+
+def test_not_a_snapshot():
+    with pytest.raises(SnapshotError):
+        SVG.restore(b'not a snapshot')
@@ -0,0 +1,77 @@
+# encoding: utf-8
+"""Tests of the grid spatial index and region queries."""
+
+from __future__ import absolute_import
+
+import random
+
+from nbsvg.py.spatial import GridIndex
+from nbsvg.py.svg import SVG
+
+def overlapping(boxes, region):
+    x0, y0, x1, y1 = region
+    return [i for i, b in enumerate(boxes)
+            if not (b[2] < x0 or b[0] > x1 or b[3] < y0 or b[1] > y1)]
+
+def random_boxes(n, seed=1):
+    rng = random.Random(seed)
+    boxes = []
+    for i in range(n):
+        x, y = rng.uniform(0, 1000), rng.uniform(0, 1000)
+        w, h = rng.uniform(0, 5), rng.uniform(0, 5)
+        boxes.append((x, y, x+w, y+h))
+    return boxes
+
+def test_queries_match_brute_force():
+    boxes = random_boxes(2000) + [(0, 0, 1000, 1000), (-50, 400, 1050, 420)]
+    index = GridIndex.from_boxes(range(len(boxes)), boxes)
+    rng = random.Random(2)
+    for _ in range(50):
+        x, y = rng.uniform(-100, 1000), rng.uniform(-100, 1000)
+        region = (x, y, x + rng.uniform(0, 300), y + rng.uniform(0, 300))
+        assert index.query(*region) == overlapping(boxes, region)
+    assert index.point(500, 410) == overlapping(boxes, (500, 410, 500, 410))
+
+def test_cells_fit_the_median_box():
+    boxes = random_boxes(2000) + [(0, 0, 1000, 1000)]
+    index = GridIndex.from_boxes(range(len(boxes)), boxes)
+    assert index.cell_size < 50
+    # the background covers too many cells to be copied into each
+    assert index._large == set([len(boxes) - 1])
+
+def test_insert_and_discard():
+    index = GridIndex(10)
+    index.insert('a', (0, 0, 5, 5))
+    index.insert('b', (20, 20, 25, 25))
+    index.insert('c', (-1000, -1000, 1000, 1000))
+    assert len(index) == 3 and 'c' in index
+    assert index.query(0, 0, 30, 30) == ['a', 'b', 'c']
+    # moving an item keeps its place in the order
+    index.insert('a', (22, 22, 23, 23))
+    assert index.query(21, 21, 24, 24) == ['a', 'b', 'c']
+    assert index.query(0, 0, 5, 5) == ['c']
+    index.discard('c')
+    index.discard('missing')
+    assert index.query(0, 0, 30, 30) == ['a', 'b']
+    assert index.box('b') == (20, 20, 25, 25)
+    index.discard('a')
+    index.discard('b')
+    assert len(index) == 0 and index._cells == {}
+
+def test_empty():
+    index = GridIndex.from_boxes([], [])
+    assert index.query(0, 0, 1, 1) == []
+
+def members(collection):
+    return [ref() for ref in collection.children]
+
+def test_select_region_and_hit_test():
+    view = SVG()
+    near = view.Circle(cx=10, cy=10, r=5)
+    far = view.Circle(cx=100, cy=100, r=5)
+    assert members(view.select_region(0, 0, 50, 50)) == [near]
+    assert members(view.hit_test(100, 104)) == [far]
+    far.cx, far.cy = 20, 20
+    assert members(view.select_region(0, 0, 50, 50)) == [near, far]
+    view.remove(near)
+    assert members(view.hit_test(10, 10)) == []
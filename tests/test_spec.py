@@ -0,0 +1,100 @@
+# encoding: utf-8
+"""Tests of the streaming spec reader, path data parsing and from_spec."""
+
+from __future__ import absolute_import
+
+import io
+import json
+from collections import OrderedDict
+
+import pytest
+
+from nbsvg.py.spec import SpecReader, SpecError, walk_spec, VECTOR_SCAN
+from nbsvg.py.pathdata import parse_path_data
+from nbsvg.py.svg import from_spec
+
+SPEC = {'type': 'svg', 'width': 1.5, 'height': -2e3, 'viewBox': [0, 0, 10.25, 1e-2],
+        'children': [
+            {'type': 'text', 'string': u'a "q" \xe9 \\ ] } [', 'x': 12345.678},
+            {'type': 'path', 'd': 'M 1 2 L 3 4', 'children': []},
+            {'type': 'g', 'children': [{'type': 'circle', 'r': 10}], 'fill': 'red'}]}
+
+def events(read):
+    """Returns the calls made to open and close by read(open, close)"""
+    calls = []
+    def open(attrs, parent):
+        calls.append(('open', sorted(attrs.items()), parent))
+        return len(calls) - 1
+    def close(handle, attrs):
+        calls.append(('close', handle, sorted(attrs.items())))
+    read(open, close)
+    return calls
+
+def text_stream(text):
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    return io.StringIO(text)
+
+def read_text(text, chunk_size):
+    return events(SpecReader(text_stream(text), chunk_size).read)
+
+def test_matches_walk_spec():
+    expected = events(lambda open, close: walk_spec(SPEC, open, close))
+    # children last, so every attribute is known when an element opens
+    text = json.dumps(OrderedDict(sorted(SPEC.items(), key=lambda i: i[0] == 'children')))
+    calls = read_text(text, 2**16)
+    assert calls[:2] == expected[:2]
+    assert [c[0] for c in calls] == [c[0] for c in expected]
+
+@pytest.mark.parametrize('chunk_size', range(1, 40))
+def test_chunk_boundaries(chunk_size):
+    text = json.dumps(SPEC)
+    assert read_text(text, chunk_size) == read_text(text, 2**16)
+
+def test_numbers_split_across_chunks():
+    text = json.dumps({'type': 'circle', 'r': 123456.789e-2})
+    for chunk_size in range(1, len(text)):
+        calls = read_text(text, chunk_size)
+        assert dict(calls[0][1])['r'] == 123456.789e-2
+
+def test_utf8_bytes():
+    text = json.dumps(SPEC, ensure_ascii=False)
+    for chunk_size in (1, 2, 3, 7):
+        stream = io.BytesIO(text.encode('utf-8'))
+        calls = events(SpecReader(stream, chunk_size).read)
+        assert calls == read_text(text, 2**16)
+
+def test_long_values():
+    points = [[i, i*0.5] for i in range(4*VECTOR_SCAN)]
+    text = json.dumps({'type': 'polyline', 'points': points, 'nested': [[[1]], {'a': [2]}]})
+    for chunk_size in (5, 64, 2**16):
+        attrs = dict(read_text(text, chunk_size)[0][1])
+        assert attrs['points'] == points
+        assert attrs['nested'] == [[[1]], {'a': [2]}]
+
+@pytest.mark.parametrize('text', ['{"type": "g"} extra', '{"type": "g",}',
+                                  '{"children": [{}, ]}', '{"r": 1', '[]'])
+def test_malformed(text):
+    with pytest.raises(SpecError):
+        read_text(text, 3)
+
+def test_parse_round_trip():
+    d = 'M 1 2 l 3 4 5 6 H 7 v -8 C 1 2 3 4 5 6 s 1 2 3 4 Q 1 2 3 4 t 5 6 a 3 3 0 0 1 10 0 Z'
+    buf = parse_path_data(d)
+    assert buf.render() == d
+    assert parse_path_data(buf.render()).render() == d
+
+def test_parse_compact_numbers():
+    buf = parse_path_data('M1.5-2L.5.5,1e1-3z')
+    assert list(buf.commands()) == [('M', [1.5, -2]), ('L', [0.5, 0.5]),
+                                    ('L', [10, -3]), ('z', [])]
+
+def test_parse_needs_a_command():
+    with pytest.raises(ValueError):
+        parse_path_data('1 2 L 3 4')
+
+def test_from_spec_sources():
+    expected = from_spec(SPEC)._repr_svg_()
+    text = json.dumps(SPEC)
+    assert from_spec(text)._repr_svg_() == expected
+    assert from_spec(text_stream(text), chunk_size=5)._repr_svg_() == expected